@@ -0,0 +1,38 @@
+"Calculating CUE for a directory of model files"
+
+import os
+import shutil
+import tempfile
+
+from gem2cue.batch import run_files
+from gem2cue.cache import default_cache
+
+from .common import TEST_FILES
+
+# Number of copies of iIT341 in the directory
+N_FILES = 8
+
+
+class RunFiles:
+    # Workers read their own files, so with more than one, parsing one file
+    # overlaps solving another and the time should drop with the workers
+    params = [1, 2, 4]
+    param_names = ['workers']
+    timeout = 600
+
+    def setup(self, workers):
+        self.model_dir = tempfile.mkdtemp()
+        for k in range(N_FILES):
+            shutil.copy(os.path.join(TEST_FILES, 'iIT341.xml'), os.path.join(self.model_dir, f'iIT341_{k}.xml'))
+
+    def teardown(self, workers):
+        shutil.rmtree(self.model_dir)
+
+    def time_run_files(self, workers):
+        # Parse every file, as in the first run of a campaign
+        with default_cache(None):
+            run_files(self.model_dir, workers=workers)
+
+    def peakmem_run_files(self, workers):
+        with default_cache(None):
+            run_files(self.model_dir, workers=workers)
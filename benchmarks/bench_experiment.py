@@ -0,0 +1,61 @@
+"Solving experiments and calculating their CUE"
+
+import gem2cue.utils
+
+from .common import MODELS, get_model
+
+
+class ExperimentSuite:
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup_cache(self):
+        return {name: get_model(name) for name in MODELS}
+
+    def setup(self, models, name):
+        self.strain = gem2cue.utils.Strain(name, models[name], copy=False)
+        # An experiment that has been solved, for the steps after FBA
+        self.experiment = gem2cue.utils.Experiment(self.strain)
+        self.experiment.run()
+
+    def time_run(self, models, name):
+        gem2cue.utils.Experiment(self.strain).run()
+
+    def time_run_compact(self, models, name):
+        gem2cue.utils.Experiment(self.strain, compact=True).run()
+
+    def time_atom_exchange(self, models, name):
+        # Rebuild the exchange index rather than reading it from the strain
+        self.strain.invalidate_indexes()
+        self.experiment._atomExchangeMetabolite()
+
+    def time_atom_exchange_cached(self, models, name):
+        self.experiment._atomExchangeMetabolite()
+
+    def time_cue(self, models, name):
+        self.experiment.cue = None
+        self.experiment.CUE()
+
+    def time_gge(self, models, name):
+        self.experiment.cue = None
+        self.experiment.CUE(definition='GGE')
+
+    def time_run_and_cue(self, models, name):
+        gem2cue.utils.Experiment(self.strain).CUE()
+
+    def time_cue_sensitivity(self, models, name):
+        self.experiment.CUE_sensitivity()
+
+
+class ExperimentMemory:
+    # No shared cache, so only the model being measured is in memory
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup(self, name):
+        self.strain = gem2cue.utils.Strain(name, get_model(name), copy=False)
+
+    def peakmem_run(self, name):
+        gem2cue.utils.Experiment(self.strain).run()
@@ -0,0 +1,40 @@
+"Reading models, straight from SBML and through the model cache"
+
+import os
+import shutil
+import tempfile
+
+import cobra
+
+from gem2cue.cache import ModelCache, load_model
+
+from .common import BUNDLED, TEST_FILES
+
+
+class ModelLoading:
+    # Only the bundled models have files to read
+    params = BUNDLED
+    param_names = ['model']
+
+    def setup(self, name):
+        self.path = os.path.join(TEST_FILES, f'{name}.xml')
+        # A cache that already holds the model
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ModelCache(self.cache_dir)
+        load_model(self.path, self.cache)
+
+    def teardown(self, name):
+        self.cache.cache.close()
+        shutil.rmtree(self.cache_dir)
+
+    def time_read_sbml(self, name):
+        cobra.io.read_sbml_model(self.path)
+
+    def time_load_model_cached(self, name):
+        load_model(self.path, self.cache)
+
+    def peakmem_read_sbml(self, name):
+        cobra.io.read_sbml_model(self.path)
+
+    def peakmem_load_model_cached(self, name):
+        load_model(self.path, self.cache)
@@ -0,0 +1,41 @@
+"Making strains, with their own copy of the model or sharing it"
+
+import gem2cue.utils
+
+from .common import MODELS, get_model
+
+
+class StrainConstruction:
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup_cache(self):
+        return {name: get_model(name) for name in MODELS}
+
+    def setup(self, models, name):
+        self.model = models[name]
+        self.strain = gem2cue.utils.Strain(name, self.model, copy=False)
+
+    def time_copy(self, models, name):
+        gem2cue.utils.Strain(name, self.model)
+
+    def time_shared(self, models, name):
+        gem2cue.utils.Strain(name, self.model, copy=False)
+
+    def time_own_model(self, models, name):
+        # Copy-on-write of a shared model, on a fresh strain each time
+        gem2cue.utils.Strain(name, self.model, copy=False).own_model()
+
+
+class StrainMemory:
+    # No shared cache, so only the model being measured is in memory
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup(self, name):
+        self.model = get_model(name)
+
+    def peakmem_copy(self, name):
+        gem2cue.utils.Strain(name, self.model)
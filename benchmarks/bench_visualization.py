@@ -0,0 +1,96 @@
+"Splitting up the carbon flow of many experiments, and drawing it"
+
+import shutil
+import tempfile
+
+import numpy as np
+
+import gem2cue.utils
+import gem2cue.visualization
+
+from .common import BUNDLED, MODELS, biomass_reaction, get_model
+
+# Number of experiments decomposed at once
+N_EXPERIMENTS = 100
+
+
+def solved_experiments(name: str, model) -> list:
+    "Experiments on one shared model, each with the uptake of its medium scaled at random"
+    rng = np.random.default_rng(0)
+    medium = model.medium
+    experiments = []
+    for scale in rng.uniform(0.5, 1, N_EXPERIMENTS):
+        s = gem2cue.utils.Strain(name, model, copy=False)
+        s.update_medium(gem2cue.utils.Media({r: b * scale for r, b in medium.items()}))
+        experiment = gem2cue.utils.Experiment(s)
+        experiment.run()
+        experiments.append(experiment)
+    return experiments
+
+
+class CarbonFlows:
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup_cache(self):
+        return {name: get_model(name) for name in MODELS}
+
+    def setup(self, models, name):
+        self.experiments = solved_experiments(name, models[name])
+        # Only the first copy of a scaled model counts as biomass, the timing is the same
+        self.biomass_rxn = biomass_reaction(name)
+
+    def time_carbon_flows(self, models, name):
+        gem2cue.visualization.carbon_flows(self.experiments, biomass_rxn=self.biomass_rxn)
+
+
+class CarbonFlowsMemory:
+    # No shared cache, so only the model being measured is in memory
+    params = MODELS
+    param_names = ['model']
+    timeout = 300
+
+    def setup(self, name):
+        self.experiments = solved_experiments(name, get_model(name))
+        self.biomass_rxn = biomass_reaction(name)
+
+    def peakmem_carbon_flows(self, name):
+        gem2cue.visualization.carbon_flows(self.experiments, biomass_rxn=self.biomass_rxn)
+
+
+class CompactCarbonFlows:
+    # Compact results need the biomass reaction to be the objective, which
+    # rules out the scaled models
+    params = BUNDLED
+    param_names = ['model']
+
+    def setup(self, name):
+        strain = gem2cue.utils.Strain(name, get_model(name), copy=False)
+        self.experiments = [gem2cue.utils.Experiment(strain, compact=True) for _ in range(N_EXPERIMENTS)]
+        for experiment in self.experiments:
+            experiment.run()
+
+    def time_carbon_flows(self, name):
+        gem2cue.visualization.carbon_flows(self.experiments)
+
+
+class RenderSankeys:
+    # Drawing does not depend on the model, only on the number of diagrams
+    params = [1, 20]
+    param_names = ['diagrams']
+
+    def setup(self, n):
+        self.out_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        respiration, exudation = rng.uniform(0, 0.5, n), rng.uniform(0, 0.2, n)
+        self.flows = gem2cue.visualization.carbon_flows([])
+        for i in range(n):
+            self.flows.loc[i] = [f'strain{i}', 60, 60 * respiration[i], 60 * exudation[i],
+                                 60 * (1 - respiration[i] - exudation[i])]
+
+    def teardown(self, n):
+        shutil.rmtree(self.out_dir)
+
+    def time_render_sankeys(self, n):
+        gem2cue.visualization.render_sankeys(self.flows, self.out_dir)
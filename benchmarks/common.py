@@ -0,0 +1,90 @@
+"Models shared by the benchmarks: the bundled test models and larger ones made from them"
+
+import os
+import re
+
+import cobra
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'test', 'test_files')
+
+# Model names used as benchmark parameters: a bundled model, or a bundled model
+# with its internal compartments copied, e.g. 'iIT341_x4' has 4 copies.
+# 'EC_core_flux1_x140' has over 10k reactions
+MODELS = ['EC_core_flux1', 'iIT341', 'iIT341_x4', 'EC_core_flux1_x140']
+BUNDLED = ['EC_core_flux1', 'iIT341']
+
+# Biomass reaction of each bundled model, scaled models sum those of their copies
+BIOMASS = {'EC_core_flux1': 'BIOMASS_Ecoli_core_w_GAM', 'iIT341': 'BIOMASS_HP_published'}
+
+
+def scale_model(model: cobra.Model, copies: int) -> cobra.Model:
+    """Make a larger model by copying everything but the extracellular compartment
+
+    Each copy gets its own internal metabolites (in compartments renamed to
+    e.g. 'c_1') and reactions, including its own biomass reaction, while all
+    copies share the extracellular metabolites and exchange reactions. The
+    objective is the sum of the biomass reactions, so CUE stays meaningful.
+
+    Args:
+    model (cobra.Model): Model to copy
+    copies (int): Number of copies of the internal compartments, 1 leaves the model as it is
+
+    Returns:
+    scaled (cobra.Model): The larger model
+    """
+    scaled = model.copy()
+    objective = {r.id: c for r, c in cobra.util.solver.linear_reaction_coefficients(scaled).items()}
+    internal = [m for m in model.metabolites if m.compartment != 'e']
+    reactions = [r for r in model.reactions if r not in model.exchanges]
+
+    new_reactions = []
+    for k in range(1, copies):
+        # Copy the internal metabolites, keeping their formulas
+        metabolites = {}
+        for m in internal:
+            copy = m.copy()
+            copy.id = f'{m.id}_{k}'
+            copy.compartment = f'{m.compartment}_{k}'
+            metabolites[m.id] = copy
+
+        # Copy the reactions, using the shared extracellular metabolites
+        for r in reactions:
+            # Forced fluxes (e.g. ATP maintenance) are left to the original, or the
+            # copies would use up the shared uptake and nothing could grow
+            copy = cobra.Reaction(f'{r.id}_{k}', lower_bound=min(r.lower_bound, 0), upper_bound=r.upper_bound)
+            copy.add_metabolites({metabolites.get(m.id) or scaled.metabolites.get_by_id(m.id): c
+                                  for m, c in r.metabolites.items()})
+            new_reactions.append(copy)
+            if r.id in objective:
+                objective[copy.id] = objective[r.id]
+
+    scaled.add_reactions(new_reactions)
+    scaled.objective = {scaled.reactions.get_by_id(r): c for r, c in objective.items()}
+    return scaled
+
+
+def _parse(name: str) -> tuple:
+    "Bundled model and number of copies of a name from `MODELS`"
+    scaled = re.fullmatch(r'(.+)_x(\d+)', name)
+    return (scaled.group(1), int(scaled.group(2))) if scaled else (name, 1)
+
+
+def biomass_reaction(name: str) -> str:
+    "Biomass reaction of the first copy of a model from `MODELS`"
+    return BIOMASS[_parse(name)[0]]
+
+
+def get_model(name: str) -> cobra.Model:
+    """Read a bundled model, or make a scaled one from it
+
+    Args:
+    name (str): Name from `MODELS`
+
+    Returns:
+    model (cobra.Model): The model
+    """
+    base, copies = _parse(name)
+    model = cobra.io.read_sbml_model(os.path.join(TEST_FILES, f'{base}.xml'))
+    if copies > 1:
+        model = scale_model(model, copies)
+    return model
@@ -0,0 +1,47 @@
+"""Predict and analyze Carbon Use Efficiency (CUE) from genome-scale metabolic models
+
+Submodules, and the names below, are imported on first use, so that importing
+the package (e.g. to start the command line) does not load cobra or pandas.
+"""
+import importlib
+
+# Names available from the package, and the submodule each one comes from
+_EXPORTS = {
+    'Media': 'utils',
+    'Strain': 'utils',
+    'Experiment': 'utils',
+    'run_batch': 'batch',
+    'run_files': 'batch',
+    'media_sweep': 'sweep',
+    'knockout_screen': 'knockouts',
+    'uptake_ensemble': 'ensemble',
+    'carbon_flows': 'visualization',
+    'render_sankeys': 'visualization',
+    'read_results': 'results',
+    'ResultWriter': 'results',
+    'profile': 'profiling',
+    'WorkQueue': 'workqueue',
+    'run_worker': 'workqueue',
+}
+
+_SUBMODULES = {'batch', 'cache', 'cli', 'compression', 'dfba', 'ensemble', 'knockouts', 'profiling',
+               'results', 'strain', 'sweep', 'utils', 'visualization', 'workqueue'}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    "Import a submodule, or the submodule a name comes from, the first time it is used"
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f'gem2cue.{_EXPORTS[name]}'), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'gem2cue.{name}')
+    else:
+        raise AttributeError(f"module 'gem2cue' has no attribute '{name}'")
+    # Later lookups find it without coming back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
@@ -0,0 +1,7 @@
+"Run the command line with `python -m gem2cue`"
+
+import sys
+
+from gem2cue.cli import main
+
+sys.exit(main())
@@ -0,0 +1,334 @@
+"Running many Experiments at once over a pool of worker processes"
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+import os
+from typing import List, Union
+import warnings
+
+import cobra
+import pandas as pd
+
+from gem2cue import profiling
+from gem2cue.cache import ModelCache, get_default_cache
+from gem2cue.results import ExperimentResult, ResultWriter
+from gem2cue.utils import Strain, Experiment, cue_from_fluxes
+
+
+# Strains shipped to each worker process by `_init_worker`, so that every
+# model is pickled once per worker rather than once per task
+_WORKER_STRAINS = None
+
+# Columns of the table returned by `run_batch`
+RESULT_COLUMNS = ['strain', 'status', 'growth', 'cue', 'error']
+
+
+def _init_worker(strains: List[Strain]):
+    "Store the strains in the worker process"
+    global _WORKER_STRAINS
+    _WORKER_STRAINS = strains
+
+
+def _run_one(strain: Strain, cue_kwargs: dict, keep_result: bool = False):
+    """Run FBA and compute CUE for a single strain, never raising
+
+    Args:
+    strain (Strain): Strain to run
+    cue_kwargs (dict): Keyword arguments passed on to `Experiment.CUE`
+    keep_result (bool): Whether to also return a compact result for a ResultWriter
+
+    Returns:
+    row (dict): One row of the results table
+    result (ExperimentResult): Compact result, None if not kept or if it failed
+    """
+    row = {'strain': strain.name, 'status': None, 'growth': None, 'cue': None, 'error': None}
+    result = None
+    try:
+        # Silence the per-experiment solver warnings, the status column has them
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            experiment = Experiment(strain)
+            experiment.run()
+            row['status'] = experiment.solution.status
+            row['growth'] = experiment.solution.objective_value
+            # Only compute CUE from optimal solutions
+            if experiment.solution.status == 'optimal':
+                experiment.CUE(**cue_kwargs)
+                row['cue'] = experiment.cue
+
+            if keep_result:
+                ex_index = strain.exchange_index(ex_nomenclature=cue_kwargs['ex_nomenclature'])
+                fluxes = experiment.solution.fluxes[ex_index.reaction_ids].to_numpy()
+                co2_index = ex_index.co2_position(cue_kwargs['co2_rxn'], cue_kwargs['definition'])
+                rcue, gge = cue_from_fluxes(fluxes, ex_index.atoms, co2_index)
+                result = ExperimentResult(row['growth'], row['status'], fluxes, ex_index.reaction_ids,
+                                          cue=rcue[0], gge=gge[0])
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = f'{type(e).__name__}: {e}'
+
+    return row, result
+
+
+def _run_index(i: int, cue_kwargs: dict, keep_result: bool):
+    "Run the i-th strain shipped to this worker"
+    return _run_one(_WORKER_STRAINS[i], cue_kwargs, keep_result)
+
+
+def run_batch(strains: List[Strain], definition: str = 'rCUE', workers: int = 1,
+              co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'},
+              max_retries: int = 1, sink: ResultWriter = None) -> pd.DataFrame:
+    """Run FBA and calculate CUE for a list of strains in parallel
+
+    Every strain is run as its own Experiment. Errors raised while solving a
+    model, and infeasible models, are recorded in the table instead of stopping
+    the batch. If a worker process dies (e.g. the solver crashes), the strains
+    lost with the pool are run again one at a time, each in a process of its
+    own, so only a strain that crashes its own process is retried (up to
+    `max_retries` times) and then recorded as crashed.
+
+    With a `sink`, each strain's result is written as soon as it finishes, and
+    strains whose strain/medium pair (see `Strain.medium_name`) the sink has
+    already written are skipped, so an interrupted batch can be rerun.
+
+    Args:
+    strains (list): List of Strain objects
+    definition (str): CUE definition passed to `Experiment.CUE` ('rCUE' or 'GGE')
+    workers (int): Number of worker processes, 1 runs everything in this process
+    co2_rxn (str): Name of the respiration reaction in the models
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    max_retries (int): Times a strain is retried after crashing a process of its own
+    sink (ResultWriter): Where to stream the results to
+
+    Returns:
+    results (pandas.DataFrame): One row per strain run, in the order given, with
+        the columns strain, status, growth, cue and error. Strains skipped
+        because the sink already has them are left out.
+    """
+    cue_kwargs = {'co2_rxn': co2_rxn, 'ex_nomenclature': ex_nomenclature, 'definition': definition}
+    keep_result = sink is not None
+
+    # Skip the strains that are already done
+    todo = list(range(len(strains)))
+    if sink is not None:
+        todo = [i for i in todo if not sink.is_done(strains[i].name, strains[i].medium_name)]
+
+    # Keep each row, and stream its result out as soon as it is in
+    rows = [None] * len(strains)
+
+    def finish(i, row, result):
+        rows[i] = row
+        if sink is not None and result is not None:
+            sink.write(strains[i].name, result, strains[i].medium_name)
+
+    # Run serially when there is only one worker
+    if workers is None or workers <= 1:
+        for i in todo:
+            finish(i, *_run_one(strains[i], cue_kwargs, keep_result))
+        return _results_table(rows, sink)
+
+    lost = []
+    # Profile the tasks in the workers if profiling is on here
+    profiled = profiling.get_profiler() is not None
+    # Ship the strains to each worker once, tasks only carry an index
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(strains,)) as pool:
+        futures = {pool.submit(profiling.run_profiled, profiled, _run_index, i, cue_kwargs, keep_result): i
+                   for i in todo}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                output, stats = future.result()
+            except BrokenProcessPool:
+                lost.append(i)
+            else:
+                profiling.merge(stats)
+                finish(i, *output)
+
+    # A crash takes every unfinished strain down with the pool, so run those
+    # one at a time to find out which of them crashed
+    for i in sorted(lost):
+        finish(i, *_run_alone(_run_one, (strains[i], cue_kwargs, keep_result), strains[i].name, max_retries))
+
+    return _results_table(rows, sink)
+
+
+def _run_alone(function, args: tuple, name: str, max_retries: int):
+    """Run a task lost with a crashed pool in a process of its own
+
+    Only a crash of the task itself counts, it is run again up to `max_retries`
+    times before being recorded as crashed.
+
+    Args:
+    function (callable): `_run_one`, or another function returning a row and a result
+    args (tuple): Arguments of `function`
+    name (str): Name of the strain, for the row of a crashed task
+    max_retries (int): Times the task is run again after crashing its process
+
+    Returns:
+    row (dict): One row of the results table
+    result (ExperimentResult): Compact result, None if not kept or if it failed
+    """
+    profiled = profiling.get_profiler() is not None
+    for _ in range(max_retries + 1):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                output, stats = pool.submit(profiling.run_profiled, profiled, function, *args).result()
+            except BrokenProcessPool:
+                continue
+        profiling.merge(stats)
+        return output
+    return {'strain': name, 'status': 'error', 'growth': None, 'cue': None,
+            'error': 'Worker process crashed'}, None
+
+
+def _results_table(rows: list, sink: ResultWriter = None) -> pd.DataFrame:
+    "Table of the strains that were run, after writing out what is left in the sink"
+    if sink is not None:
+        sink.flush()
+    return pd.DataFrame([r for r in rows if r is not None], columns=RESULT_COLUMNS)
+
+
+def list_model_files(directory: str) -> List[str]:
+    "SBML files (.xml or .sbml) in a directory, sorted by name"
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.lower().endswith(('.xml', '.sbml')))
+
+
+def _strain_name(path: str) -> str:
+    "Name of the strain in a model file, the file name without its extension"
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _run_file(path: str, cache: ModelCache, cue_kwargs: dict, keep_result: bool = False):
+    """Read a model file and run it, never raising
+
+    Args:
+    path (str): Path to an SBML file, the strain is named after it
+    cache (ModelCache): Model cache to read the file through, None reads it directly
+    cue_kwargs (dict): Keyword arguments passed on to `Experiment.CUE`
+    keep_result (bool): Whether to also return a compact result for a ResultWriter
+
+    Returns:
+    row (dict): One row of the results table
+    result (ExperimentResult): Compact result, None if not kept or if it failed
+    """
+    name = _strain_name(path)
+    try:
+        model = cobra.io.read_sbml_model(path) if cache is None else cache.load(path)
+    except Exception as e:
+        return {'strain': name, 'status': 'error', 'growth': None, 'cue': None,
+                'error': f'{type(e).__name__}: {e}'}, None
+    return _run_one(Strain(name, model, copy=False), cue_kwargs, keep_result)
+
+
+def run_files(paths: Union[str, List[str]], definition: str = 'rCUE', workers: int = 1,
+              prefetch: int = 2, co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'},
+              max_retries: int = 1, sink: ResultWriter = None, cache: ModelCache = None) -> pd.DataFrame:
+    """Calculate CUE for many model files, loading models while others are solved
+
+    Each worker process reads its files (through the model cache) and solves
+    them, so while one worker parses a model the others solve theirs. Workers
+    are only sent file paths, never models. Each worker has at most `prefetch`
+    files queued for it, which bounds how much work a crash can lose. Strains
+    are named after their files.
+
+    Files that fail to load, errors while solving, infeasible models and
+    crashed workers are recorded as in `run_batch`.
+
+    Args:
+    paths (str or list): Directory with SBML files, or a list of SBML files
+    definition (str): CUE definition passed to `Experiment.CUE` ('rCUE' or 'GGE')
+    workers (int): Number of worker processes, 1 reads and solves in this process
+    prefetch (int): Number of files queued for each worker
+    co2_rxn (str): Name of the respiration reaction in the models
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    max_retries (int): Times a file is retried after crashing a process of its own
+    sink (ResultWriter): Where to stream the results to, files it already has are not loaded
+    cache (ModelCache): Model cache, defaults to `gem2cue.cache.get_default_cache()`
+
+    Returns:
+    results (pandas.DataFrame): One row per file run, in the order given, with
+        the columns strain, status, growth, cue and error
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = list_model_files(paths)
+    cue_kwargs = {'co2_rxn': co2_rxn, 'ex_nomenclature': ex_nomenclature, 'definition': definition}
+    keep_result = sink is not None
+    # Settle the cache here, so the workers use the same one as this process
+    if cache is None:
+        cache = get_default_cache()
+
+    # Skip the files that are already done
+    todo = [i for i in range(len(paths)) if sink is None or not sink.is_done(_strain_name(paths[i]))]
+    rows = [None] * len(paths)
+
+    def finish(i, row, result):
+        rows[i] = row
+        if sink is not None and result is not None:
+            sink.write(row['strain'], result)
+
+    # Read and solve in turn when there is only one worker
+    if workers is None or workers <= 1:
+        for i in todo:
+            finish(i, *_run_file(paths[i], cache, cue_kwargs, keep_result))
+        return _results_table(rows, sink)
+
+    while todo:
+        lost, todo = _solve_files(paths, todo, finish, cache, cue_kwargs, keep_result, workers, prefetch)
+        # A crash takes every file in flight down with the pool, so run those
+        # one at a time to find out which of them crashed
+        for i in lost:
+            finish(i, *_run_alone(_run_file, (paths[i], cache, cue_kwargs, keep_result),
+                                  _strain_name(paths[i]), max_retries))
+
+    return _results_table(rows, sink)
+
+
+def _solve_files(paths: List[str], todo: List[int], finish, cache: ModelCache, cue_kwargs: dict,
+                 keep_result: bool, workers: int, prefetch: int) -> tuple:
+    """Read and solve files in a process pool until they are done or the pool breaks
+
+    Args:
+    paths (list): Model files
+    todo (list): Indexes of the files to run
+    finish (callable): Called with the index, row and result of each file run
+    cache (ModelCache): Model cache the workers read the files through
+    cue_kwargs (dict): Keyword arguments passed on to `Experiment.CUE`
+    keep_result (bool): Whether to also return compact results
+    workers (int): Number of worker processes
+    prefetch (int): Number of files queued for each worker
+
+    Returns:
+    lost (list): Indexes of the files that were in flight when the pool broke
+    left (list): Indexes of the files that were never sent to the pool
+    """
+    lost = []
+    in_flight = {}
+    # Profile the tasks in the workers if profiling is on here
+    profiled = profiling.get_profiler() is not None
+
+    def collect(futures):
+        for future in futures:
+            i = in_flight.pop(future)
+            try:
+                output, stats = future.result()
+            except BrokenProcessPool:
+                lost.append(i)
+            else:
+                profiling.merge(stats)
+                finish(i, *output)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for k, i in enumerate(todo):
+            # Wait for room in the queues of the workers
+            if len(in_flight) >= workers * prefetch:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+            if lost:
+                collect(list(in_flight))
+                return sorted(lost), todo[k:]
+            in_flight[pool.submit(profiling.run_profiled, profiled, _run_file,
+                                  paths[i], cache, cue_kwargs, keep_result)] = i
+        collect(list(in_flight))
+
+    return sorted(lost), []
@@ -0,0 +1,224 @@
+"Caching parsed models and FBA solutions on disk"
+
+from contextlib import contextmanager
+import hashlib
+import os
+
+import appdirs
+import cobra
+from cobra.util.solver import linear_reaction_coefficients
+import diskcache
+
+from gem2cue import profiling
+
+
+# Default limit on the size of a cache directory, in bytes (1 GB)
+DEFAULT_SIZE_LIMIT = 2**30
+
+
+class ModelCache:
+    "Parsed models stored on disk, keyed on the contents of the model file"
+
+    def __init__(self, directory: str = None, size_limit: int = DEFAULT_SIZE_LIMIT):
+        """
+        directory: Where to keep the cache, defaults to the user's cache directory
+        size_limit: Size of the cache in bytes, least recently used models are
+            evicted past it
+        """
+        if directory is None:
+            directory = os.path.join(appdirs.user_cache_dir('gem2cue'), 'models')
+        self.directory = directory
+        self.cache = diskcache.Cache(directory, size_limit=size_limit,
+                                     eviction_policy='least-recently-used')
+
+    def key(self, path: str) -> str:
+        """Key of a model file in the cache
+
+        The key is a hash of the file contents, so renamed or copied files hit
+        the same entry and edited files miss. The cobra version is part of the
+        key, since models pickled by one version may not load in another, and
+        so is the configured solver, since a pickled model keeps the solver it
+        was read with.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                digest.update(chunk)
+        solver = cobra.Configuration().solver.__name__
+        return f'cobra-{cobra.__version__}-{solver}-{digest.hexdigest()}'
+
+    def load(self, path: str) -> cobra.core.Model:
+        """Read a model file, from the cache if it has been read before
+
+        Args:
+        path (str): Path to an SBML file
+
+        Returns:
+        model (cobra.core.Model): A new model object, safe to change
+        """
+        key = self.key(path)
+        model = self.cache.get(key)
+        if model is None:
+            profiling.count('model_cache.miss')
+            model = cobra.io.read_sbml_model(path)
+            self.cache.set(key, model)
+        else:
+            profiling.count('model_cache.hit')
+        return model
+
+    def clear(self):
+        "Remove every model from the cache"
+        self.cache.clear()
+
+    def close(self):
+        self.cache.close()
+
+
+def structure_hash(model: cobra.core.Model) -> str:
+    "Hash of the reactions of a model and their stoichiometry"
+    digest = hashlib.sha256()
+    for r in model.reactions:
+        stoichiometry = sorted((m.id, c) for m, c in r.metabolites.items())
+        digest.update(repr((r.id, stoichiometry)).encode())
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    "FBA solutions stored on disk, keyed on the model, its bounds and its objective"
+
+    def __init__(self, directory: str = None, size_limit: int = DEFAULT_SIZE_LIMIT,
+                 eviction_policy: str = 'least-recently-used'):
+        """
+        directory: Where to keep the cache, defaults to the user's cache directory
+        size_limit: Size of the cache in bytes, solutions are evicted past it
+        eviction_policy: Which solutions to evict first, any diskcache eviction
+            policy ('least-recently-used', 'least-recently-stored',
+            'least-frequently-used' or 'none')
+        """
+        if directory is None:
+            directory = os.path.join(appdirs.user_cache_dir('gem2cue'), 'solutions')
+        self.directory = directory
+        self.cache = diskcache.Cache(directory, size_limit=size_limit,
+                                     eviction_policy=eviction_policy)
+
+    def key(self, model: cobra.core.Model, structure: str = None) -> str:
+        """Key of the FBA problem of a model in its current state
+
+        The key covers the stoichiometry, the bounds of every reaction (and so
+        the medium), the objective and the solver.
+
+        Args:
+        model (cobra.core.Model): Model, with its medium applied
+        structure (str): `structure_hash(model)`, if it is already known
+
+        Returns:
+        key (str)
+        """
+        if structure is None:
+            structure = structure_hash(model)
+        digest = hashlib.sha256(structure.encode())
+        digest.update(repr([(r.lower_bound, r.upper_bound) for r in model.reactions]).encode())
+        objective = sorted((r.id, c) for r, c in linear_reaction_coefficients(model).items())
+        digest.update(repr((objective, model.objective.direction)).encode())
+        digest.update(model.solver.interface.__name__.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Look up a solution
+
+        Returns:
+        solution (cobra.Solution): The solution with its fluxes, without
+            reduced costs or shadow prices, None if it is not in the cache
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        return cobra.Solution(entry['objective_value'], entry['status'], entry['fluxes'])
+
+    def set(self, key: str, solution: cobra.Solution):
+        "Store the objective value, status and fluxes of a solution"
+        self.cache.set(key, {'objective_value': solution.objective_value,
+                             'status': solution.status,
+                             'fluxes': solution.fluxes})
+
+    def invalidate(self, key: str = None):
+        """Remove a solution from the cache
+
+        Args:
+        key (str): Key of the solution to remove, None removes all of them
+        """
+        if key is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(key)
+
+    def close(self):
+        self.cache.close()
+
+
+# Cache used by `load_model` when none is given, made on first use
+_default_cache = None
+_default_cache_enabled = True
+
+
+def get_default_cache():
+    "The cache `load_model` uses by default, None if caching is turned off"
+    global _default_cache
+    if _default_cache is None and _default_cache_enabled:
+        _default_cache = ModelCache()
+    return _default_cache
+
+
+def set_default_cache(cache: ModelCache = None):
+    """Change the cache `load_model` uses by default
+
+    Args:
+    cache (ModelCache): Cache to use, None turns caching off
+    """
+    global _default_cache, _default_cache_enabled
+    _default_cache = cache
+    _default_cache_enabled = cache is not None
+
+
+def reset_default_cache():
+    "Go back to the default cache in the user's cache directory, made on first use"
+    global _default_cache, _default_cache_enabled
+    _default_cache = None
+    _default_cache_enabled = True
+
+
+@contextmanager
+def default_cache(cache: ModelCache = None):
+    """Change the cache `load_model` uses by default inside the context only
+
+    Ex. with default_cache(None):
+            model = load_model(path)  # Read without a cache
+
+    Args:
+    cache (ModelCache): Cache to use, None turns caching off
+    """
+    global _default_cache, _default_cache_enabled
+    previous = (_default_cache, _default_cache_enabled)
+    set_default_cache(cache)
+    try:
+        yield cache
+    finally:
+        _default_cache, _default_cache_enabled = previous
+
+
+def load_model(path: str, cache: ModelCache = None) -> cobra.core.Model:
+    """Read an SBML model, going through a model cache
+
+    Args:
+    path (str): Path to an SBML file
+    cache (ModelCache): Cache to use, defaults to `get_default_cache()`
+
+    Returns:
+    model (cobra.core.Model)
+    """
+    if cache is None:
+        cache = get_default_cache()
+    with profiling.phase('model.load'):
+        if cache is None:
+            return cobra.io.read_sbml_model(path)
+        return cache.load(path)
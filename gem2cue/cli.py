@@ -0,0 +1,183 @@
+"""Command line interface, installed as the `gem2cue` command
+
+Only the standard library is imported here, anything heavier is imported once
+the arguments have been parsed, so `gem2cue --help` and mistyped commands
+return at once.
+"""
+
+import argparse
+import os
+import sys
+from typing import List
+
+
+def _add_cue_parser(subparsers):
+    parser = subparsers.add_parser('cue', help='Calculate CUE for model files',
+                                   description='Calculate CUE for an SBML model file, or for every '
+                                               'SBML file (.xml or .sbml) in a directory. Prints '
+                                               'a CSV table with one row per model.')
+    parser.add_argument('path', help='SBML file, or directory of SBML files')
+    parser.add_argument('-d', '--definition', choices=['rCUE', 'GGE'], default='rCUE',
+                        help='CUE definition (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of solver processes, 1 solves in this process (default: %(default)s)')
+    parser.add_argument('--co2-rxn', default='EX_co2_e',
+                        help='Respiration reaction in the models (default: %(default)s)')
+    parser.add_argument('--ex-compartment', action='append', dest='ex_compartments', metavar='COMPARTMENT',
+                        help="Compartment of the exchange reactions, can be given more than once (default: e)")
+    parser.add_argument('-o', '--output', help='CSV file to write the table to, instead of printing it')
+    parser.add_argument('--results-dir',
+                        help='Also stream the results to this directory (see gem2cue.results.ResultWriter), '
+                             'models already in it are skipped')
+    parser.add_argument('--chunk-size', type=int, default=1,
+                        help='Number of results per file in --results-dir, results not yet written are '
+                             'lost if the run dies (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='Read the model files without the model cache')
+    parser.set_defaults(command=_cue)
+
+
+def _cue(args: argparse.Namespace) -> int:
+    "Run the `cue` command, exits with 1 if any model failed"
+    from gem2cue import batch, cache, results
+
+    if not os.path.exists(args.path):
+        print(f'gem2cue cue: {args.path} does not exist', file=sys.stderr)
+        return 2
+    if args.no_cache:
+        cache.set_default_cache(None)
+    paths = args.path if os.path.isdir(args.path) else [args.path]
+    sink = results.ResultWriter(args.results_dir, args.chunk_size) if args.results_dir else None
+
+    table = batch.run_files(paths, definition=args.definition, workers=args.workers, co2_rxn=args.co2_rxn,
+                            ex_nomenclature=set(args.ex_compartments or ['e']), sink=sink)
+    if sink is not None:
+        sink.close()
+
+    table.to_csv(args.output if args.output else sys.stdout, index=False)
+    return int((table['status'] == 'error').any())
+
+
+def _add_queue_parser(subparsers):
+    parser = subparsers.add_parser('queue', help='Run a CUE campaign from a shared task queue',
+                                   description='Run a CUE campaign from a queue of tasks in an SQLite '
+                                               'database, with workers on any number of machines (see '
+                                               'gem2cue.workqueue.WorkQueue).')
+    commands = parser.add_subparsers(title='commands', metavar='command')
+    commands.required = True
+
+    add = commands.add_parser('add', help='Add a task for every model in every medium')
+    add.add_argument('queue', help='Database file of the queue, made if it does not exist')
+    add.add_argument('path', help='SBML file, or directory of SBML files')
+    add.add_argument('--media', help='JSON file of media, {name: {exchange reaction: bound}}, '
+                                     "defaults to each model's own medium")
+    add.add_argument('-d', '--definition', choices=['rCUE', 'GGE'], default='rCUE',
+                     help='CUE definition (default: %(default)s)')
+    add.set_defaults(command=_queue_add)
+
+    work = commands.add_parser('work', help='Run tasks from the queue until there are none left')
+    work.add_argument('queue', help='Database file of the queue')
+    work.add_argument('--name', help='Name of the worker (default: host name and process ID)')
+    work.add_argument('--batch-size', type=int, default=1,
+                      help='Number of tasks claimed at a time (default: %(default)s)')
+    work.add_argument('--lease', type=float, default=600.0,
+                      help='Seconds the worker has to finish each task (default: %(default)s)')
+    work.add_argument('--max-retries', type=int, default=1,
+                      help='Times a task whose lease ran out is handed out again (default: %(default)s)')
+    work.add_argument('--wait', action='store_true',
+                      help='Keep polling while other workers hold tasks, rather than stopping')
+    work.add_argument('--max-tasks', type=int, help='Stop after this many tasks')
+    work.add_argument('--co2-rxn', default='EX_co2_e',
+                      help='Respiration reaction in the models (default: %(default)s)')
+    work.add_argument('--ex-compartment', action='append', dest='ex_compartments', metavar='COMPARTMENT',
+                      help="Compartment of the exchange reactions, can be given more than once (default: e)")
+    work.add_argument('--no-cache', action='store_true', help='Read the model files without the model cache')
+    work.set_defaults(command=_queue_work)
+
+    status = commands.add_parser('status', help='Print how many tasks are pending, running, done and failed')
+    status.add_argument('queue', help='Database file of the queue')
+    status.set_defaults(command=_queue_status)
+
+    results = commands.add_parser('results', help='Print every task with its result, as CSV')
+    results.add_argument('queue', help='Database file of the queue')
+    results.add_argument('-o', '--output', help='CSV file to write the table to, instead of printing it')
+    results.set_defaults(command=_queue_results)
+
+
+def _queue_add(args: argparse.Namespace) -> int:
+    import json
+    from gem2cue.utils import Media
+    from gem2cue.workqueue import WorkQueue
+
+    if not os.path.exists(args.path):
+        print(f'gem2cue queue add: {args.path} does not exist', file=sys.stderr)
+        return 2
+    media = None
+    if args.media:
+        with open(args.media) as f:
+            media = {name: Media(bounds, name) for name, bounds in json.load(f).items()}
+
+    queue = WorkQueue(args.queue)
+    added = queue.enqueue(args.path, media, args.definition)
+    print(f'Added {added} tasks, {queue.progress()["total"]} in the queue')
+    queue.close()
+    return 0
+
+
+def _queue_work(args: argparse.Namespace) -> int:
+    from gem2cue import cache
+    from gem2cue.workqueue import run_worker
+
+    if args.no_cache:
+        cache.set_default_cache(None)
+    n_tasks = run_worker(args.queue, worker=args.name, batch_size=args.batch_size, lease=args.lease,
+                         max_retries=args.max_retries, wait=args.wait, max_tasks=args.max_tasks,
+                         co2_rxn=args.co2_rxn, ex_nomenclature=set(args.ex_compartments or ['e']))
+    print(f'Ran {n_tasks} tasks')
+    return 0
+
+
+def _queue_status(args: argparse.Namespace) -> int:
+    from gem2cue.workqueue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    progress = queue.progress()
+    queue.close()
+    finished = progress['done'] + progress['failed']
+    print(f"{finished}/{progress['total']} tasks finished: {progress['done']} done, {progress['failed']} failed, "
+          f"{progress['running']} running ({progress['expired']} with an expired lease) on "
+          f"{progress['workers']} workers, {progress['pending']} pending")
+    return 0
+
+
+def _queue_results(args: argparse.Namespace) -> int:
+    from gem2cue.workqueue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    queue.results().to_csv(args.output if args.output else sys.stdout, index=False)
+    queue.close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    "Parser of the `gem2cue` command"
+    parser = argparse.ArgumentParser(prog='gem2cue',
+                                     description='Predict Carbon Use Efficiency (CUE) from genome-scale '
+                                                 'metabolic models.')
+    subparsers = parser.add_subparsers(title='commands', metavar='command')
+    subparsers.required = True
+    _add_cue_parser(subparsers)
+    _add_queue_parser(subparsers)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    """Run the `gem2cue` command
+
+    Args:
+    argv (list): Arguments, defaults to the ones the program was started with
+
+    Returns:
+    status (int): Exit status
+    """
+    args = build_parser().parse_args(argv)
+    return args.command(args)
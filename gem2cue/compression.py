@@ -0,0 +1,199 @@
+"Shrinking a model before solving it many times, while keeping its fluxes in terms of the original reactions"
+
+from typing import List
+import warnings
+
+import cobra
+from cobra.util.solver import linear_reaction_coefficients
+import pandas as pd
+from scipy import sparse
+
+
+class Compression:
+    """
+    How the reactions of a model were merged or removed by `compress_model`
+
+    Each original reaction either carries no flux in any medium (it was
+    blocked) or carries a fixed multiple of the flux of one reaction of the
+    compressed model.
+
+    Inputs:
+    | reaction_ids <list>: IDs of the reactions of the original model
+    | compressed_ids <list>: IDs of the reactions of the compressed model
+    | reactions <dict>: Compressed reaction ID (None if blocked) and factor of
+        each original reaction, so that flux = factor * compressed flux
+    """
+    def __init__(self, reaction_ids: List[str], compressed_ids: List[str], reactions: dict):
+        self.reaction_ids = reaction_ids
+        self.compressed_ids = compressed_ids
+        self.reactions = reactions
+
+        # Matrix taking the compressed fluxes to the original ones
+        positions = {r: i for i, r in enumerate(compressed_ids)}
+        rows, cols, values = [], [], []
+        for i, r in enumerate(reaction_ids):
+            target, factor = reactions[r]
+            if target is not None:
+                rows.append(i)
+                cols.append(positions[target])
+                values.append(factor)
+        self.matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(reaction_ids), len(compressed_ids)))
+
+    def expand(self, fluxes: pd.Series) -> pd.Series:
+        """Fluxes of the original reactions
+
+        Args:
+        fluxes (pandas.Series): Fluxes of the compressed model, by reaction ID
+
+        Returns:
+        fluxes (pandas.Series): Fluxes of the original model, by reaction ID
+        """
+        values = self.matrix @ fluxes.reindex(self.compressed_ids).to_numpy()
+        return pd.Series(values, index=self.reaction_ids, name=fluxes.name)
+
+
+def _merge(keep: cobra.Reaction, drop: cobra.Reaction, metabolite: cobra.Metabolite, tol: float) -> float:
+    """Merge `drop` into `keep`, given that `metabolite` is only in those two reactions
+
+    The metabolite has to be balanced, so the flux of `drop` is a fixed
+    multiple of the flux of `keep`, and the merged reaction is `keep` plus that
+    multiple of `drop`. The bounds of both reactions are kept. The genes are
+    left to the caller.
+
+    Returns:
+    factor (float): Flux of `drop` per unit flux of `keep`
+    """
+    factor = -keep.metabolites[metabolite] / drop.metabolites[metabolite]
+
+    # Bounds of `keep` that keep `drop` within its bounds
+    low, high = sorted([drop.lower_bound / factor, drop.upper_bound / factor])
+    lower_bound, upper_bound = max(keep.lower_bound, low), min(keep.upper_bound, high)
+    # Guard against rounding making the bounds cross
+    keep.bounds = (lower_bound, max(lower_bound, upper_bound))
+
+    # Add up the stoichiometry, rounding what cancels out to exactly 0 so it is removed
+    coefficients = {m: c for m, c in keep.metabolites.items()}
+    for m, c in drop.metabolites.items():
+        coefficients[m] = coefficients.get(m, 0) + factor * c
+    coefficients[metabolite] = 0
+    keep.add_metabolites({m: 0 if abs(c) <= tol else c for m, c in coefficients.items()}, combine=False)
+    return factor
+
+
+def _remove_reactions(model: cobra.Model, reactions: list):
+    "Remove reactions from a model, without cobra's warning about its own call for reactions in groups"
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', 'need to pass in a list')
+        model.remove_reactions(reactions)
+
+
+def _dead_ends(model: cobra.Model, protected: set) -> List[str]:
+    """Reactions that cannot carry flux in any medium, found from the network alone
+
+    A reaction is blocked if one of its metabolites cannot be both made and
+    used by the other reactions that are not blocked, given the directions
+    they can run in. Exchanges can run both ways, since the medium sets their
+    uptake. Unlike flux variability, this does not depend on the accuracy of
+    the solver.
+
+    Args:
+    model (cobra.Model): Model to search
+    protected (set): IDs of reactions that are never marked as blocked
+
+    Returns:
+    blocked (list): IDs of the blocked reactions, in the model's order
+    """
+    exchanges = {r.id for r in model.exchanges}
+    forward = {r.id: r.upper_bound > 0 or r.id in exchanges for r in model.reactions}
+    reverse = {r.id: r.lower_bound < 0 or r.id in exchanges for r in model.reactions}
+    blocked = {r for r in forward if not (forward[r] or reverse[r]) and r not in protected}
+
+    todo = list(model.metabolites)
+    while todo:
+        metabolite = todo.pop()
+        active = [r for r in metabolite.reactions if r.id not in blocked]
+        made = any((c > 0 and forward[r.id]) or (c < 0 and reverse[r.id]) for r, c in
+                   ((r, r.metabolites[metabolite]) for r in active))
+        used = any((c < 0 and forward[r.id]) or (c > 0 and reverse[r.id]) for r, c in
+                   ((r, r.metabolites[metabolite]) for r in active))
+        if len(active) == 1 or not (made and used):
+            for r in active:
+                if r.id not in protected:
+                    blocked.add(r.id)
+                    todo.extend(r.metabolites)
+    return [r.id for r in model.reactions if r.id in blocked]
+
+
+def compress_model(model: cobra.Model, keep: List[str] = None, tol: float = 1e-9) -> Compression:
+    """Remove blocked reactions, merge coupled reaction chains and drop orphan metabolites
+
+    Reactions that cannot carry flux with any medium are removed (see
+    `_dead_ends`), so the compressed model works in any medium. Then, wherever
+    a metabolite is only in two reactions, their fluxes are coupled, and the
+    two are merged into one, until no such metabolite is left. Metabolites that are in no
+    reaction are dropped. Boundary reactions (exchanges, sinks and demands),
+    reactions in the objective and the reactions in `keep` are never removed or
+    merged. The model is changed in place.
+
+    Args:
+    model (cobra.Model): Model to compress
+    keep (list): IDs of other reactions to leave as they are
+    tol (float): Coefficients smaller than this are treated as 0
+
+    Returns:
+    compression (Compression): How to get the original fluxes back
+    """
+    reaction_ids = [r.id for r in model.reactions]
+    protected = {r.id for r in model.boundary}
+    protected.update(r.id for r in linear_reaction_coefficients(model))
+    protected.update(keep or [])
+
+    # Each reaction of the compressed model, and the original reactions it stands for
+    members = {r: {r: 1.0} for r in reaction_ids}
+    rules = {r.id: r.gene_reaction_rule for r in model.reactions}
+    reactions = {}
+
+    # Remove the reactions that are blocked in every medium
+    blocked = _dead_ends(model, protected)
+    _remove_reactions(model, blocked)
+    for r in blocked:
+        reactions[r] = (None, 0.0)
+        del members[r]
+
+    # Merge the pairs of reactions that are coupled through a metabolite
+    todo = list(model.metabolites)
+    while todo:
+        metabolite = todo.pop()
+        if metabolite.model is None or len(metabolite.reactions) != 2:
+            continue
+        first, second = sorted(metabolite.reactions, key=lambda r: r.id)
+        if first.id in protected or second.id in protected:
+            continue
+
+        touched = (set(first.metabolites) | set(second.metabolites)) - {metabolite}
+        factor = _merge(first, second, metabolite, tol)
+        for r, f in members.pop(second.id).items():
+            members[first.id][r] = f * factor
+        _remove_reactions(model, [second])
+
+        # A merged reaction left without metabolites is an unconstrained cycle
+        if not first.metabolites:
+            for r in members.pop(first.id):
+                reactions[r] = (None, 0.0)
+            _remove_reactions(model, [first])
+        todo.extend(touched)
+
+    # Drop the metabolites that are not in any reaction
+    model.remove_metabolites([m for m in model.metabolites if not m.reactions])
+
+    for target, originals in members.items():
+        for r, factor in originals.items():
+            reactions[r] = (target, factor)
+
+        # A merged reaction needs the genes of all its reactions, kept as one
+        # flat rule since deeply nested rules are slow to parse
+        if len(originals) > 1:
+            conjuncts = dict.fromkeys(f'({rules[r]})' if ' or ' in rules[r] else rules[r]
+                                      for r in originals if rules[r])
+            model.reactions.get_by_id(target).gene_reaction_rule = ' and '.join(conjuncts)
+    return Compression(reaction_ids, [r.id for r in model.reactions], reactions)
@@ -1,36 +1,233 @@
-from ctypes import Union
-from strain import Strain
-from typing import List
+from contextlib import ExitStack
+from typing import List, Union
 
+import numpy as np
+import pandas as pd
+from scipy import sparse
 
-try:
-    import surfinFBA
-except:
-    msg = """surfinFBA is required for dFBA simulations.
-    To install surfinFBA:
-        1) Clone the repository: git clone git@github.com:jdbrunner/surfin_fba.git
-        2) Enter the directory: cd surfin_fba
-        3) Install: pip install .
+from gem2cue.strain import Strain
+from gem2cue.utils import ExchangeIndex, cue_from_fluxes, get_active_bound, net_fluxes, set_active_bound
 
-    surfinFBA requires either CPLEX or GUROBI. 
+
+class ExtracellularIndex:
+    """
+    Extracellular metabolites shared by a community of strains
+
+    The pool is the union of the exchange reactions of all the strains, keyed by
+    exchange reaction ID. The exchange reactions of all strains are laid out one
+    strain after the other in one flux vector, and `matrix` maps that vector onto
+    the pool.
+
+    Inputs:
+    | strains <list>: List of Strain objects
     """
-    raise ImportError(msg)
+    def __init__(self, strains: List[Strain]):
+        # Exchange reactions of each strain, and where they start in the flux vector
+        self.exchanges = [list(s.model.exchanges) for s in strains]
+        sizes = [len(ex) for ex in self.exchanges]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+        # Union of the exchange reactions, in order of first appearance
+        self.ids = list(dict.fromkeys(r.id for ex in self.exchanges for r in ex))
+        self.positions = {r: i for i, r in enumerate(self.ids)}
+
+        # Strain that each column of the flux vector belongs to
+        self.owner = np.repeat(np.arange(len(strains)), sizes)
+
+        # Change in the pool per unit of flux: secretion through 'met <=>' adds
+        # to the pool, and flux through '<=> met' takes from it
+        rows = [self.positions[r.id] for ex in self.exchanges for r in ex]
+        values = [-1.0 if r.products and not r.reactants else 1.0 for ex in self.exchanges for r in ex]
+        self.matrix = sparse.csr_matrix((values, (rows, np.arange(len(rows)))),
+                                        shape=(len(self.ids), len(rows)))
+
+    def derivative(self, fluxes: np.ndarray, biomass: np.ndarray) -> np.ndarray:
+        """Rate of change of the pool
+
+        Args:
+        fluxes (numpy.ndarray): Exchange fluxes (mmol/gDW/h) of all the strains, laid out as in `offsets`
+        biomass (numpy.ndarray): Biomass (gDW/L) of each strain
+
+        Returns:
+        dconc (numpy.ndarray): Rate of change of each pool concentration (mmol/L/h)
+        """
+        return self.matrix @ (fluxes * biomass[self.owner])
 
 
 class Timecourse:
     """
-    Modeling CUE of a strain or community over time with surfinFBA
+    Modeling CUE of a strain or community over time with dynamic FBA
+
+    All strains share one pool of extracellular metabolites (see `ExtracellularIndex`).
+    Uptake of each metabolite in `Strain.metabolite_uptake` follows Michaelis-Menten
+    kinetics, with the uptake rate given there as the maximum rate:
+
+        uptake bound = metabolite_uptake * C / (km + C)
+
+    Every other exchange reaction can only secrete. One LP is kept per strain for
+    the whole simulation, and only the uptake bounds are changed between steps.
 
     Inputs:
     | strains <list>: List of Strain objects
-    | prep_kwargs <dict>: Keyword arguments to pass to `prep_cobrapy_models()` from surfinFBA
-        * See bottom of: https://github.com/jdbrunner/surfin_fba
+    | init_strain_biomasses <list or dict>: Initial biomass (gDW/L) of each strain, as a
+        list in the same order as `strains` or a dictionary keyed by strain name
+    | init_concentrations <dict>: Initial concentration (mmol/L) of the extracellular
+        metabolites, keyed by exchange reaction ID. Defaults to the bounds in the `model.medium`
+        of the strains
+    | km <float or dict>: Half saturation constant (mmol/L) of the uptakes, either one value
+        for all of them or a dictionary keyed by exchange reaction ID (missing ones are 1)
     """
-    def __init__(self, strains: List[Strain], init_strain_biomasses: Union[list, dict], ):
+    def __init__(self, strains: List[Strain], init_strain_biomasses: Union[list, dict],
+                 init_concentrations: dict = None, km: Union[float, dict] = 1.0):
         # Check that an 'e' compartment is in the model
         for s in strains:
             if 'e' not in s.model.compartments:
                 raise KeyError('An extracellular compartment, "e" must be defined in each model.')
-        
+
         self.strains = strains
-        self.strain_dict = {s.name: s.model for s in self.strains}
\ No newline at end of file
+        self.strain_dict = {s.name: s.model for s in self.strains}
+
+        # Initial biomasses, in the order of the strains, one for each of them
+        names = [s.name for s in strains]
+        if isinstance(init_strain_biomasses, dict):
+            if set(init_strain_biomasses) != set(names):
+                raise ValueError(f'Initial biomasses are given for {sorted(init_strain_biomasses)}, '
+                                 f'but the strains are {sorted(names)}')
+            init_strain_biomasses = [init_strain_biomasses[name] for name in names]
+        elif len(init_strain_biomasses) != len(strains):
+            raise ValueError(f'{len(init_strain_biomasses)} initial biomasses are given for '
+                             f'{len(strains)} strains')
+        self.init_strain_biomasses = np.array(init_strain_biomasses, dtype=float)
+
+        # Initial concentrations and half saturation constants
+        if init_concentrations is None:
+            init_concentrations = {}
+            for s in strains:
+                init_concentrations.update(s.model.medium)
+        self.init_concentrations = init_concentrations
+        self.km = km
+
+        # Shared pool of extracellular metabolites
+        self.pool = ExtracellularIndex(strains)
+
+        # Results, filled in by `run()`
+        self.time = None
+        self.biomass = None
+        self.concentrations = None
+        self.growth = None
+        self.cue = None
+
+    def run(self, t_end: float = 24.0, dt_max: float = 0.1, dt_min: float = 1e-4,
+            max_depletion: float = 0.1, co2_rxn: str = 'EX_co2_e', definition: str = 'rCUE'):
+        """Integrate the timecourse with adaptive explicit Euler steps
+
+        Each step is as long as `dt_max`, but short enough that no metabolite loses
+        more than `max_depletion` of its concentration, and no shorter than `dt_min`.
+
+        Args:
+        t_end (float): Length of the simulation (h)
+        dt_max (float): Longest time step (h)
+        dt_min (float): Shortest time step (h)
+        max_depletion (float): Largest fraction of any metabolite used up in one step
+        co2_rxn (str): Name of the respiration reaction in the models
+        definition (str): What definition of CUE to use ('rCUE' or 'GGE')
+
+        Returns:
+        cue (pandas.DataFrame): CUE of each strain (columns) over time (index)
+        """
+        pool = self.pool
+        n_strains = len(self.strains)
+        conc = np.array([self.init_concentrations.get(r, 0.0) for r in pool.ids], dtype=float)
+        biomass = self.init_strain_biomasses.copy()
+
+        # Michaelis-Menten parameters of each strain's uptakes: which of its
+        # exchange reactions they are, and which pool metabolites they draw on
+        limited, limited_pool, vmax, km = [], [], [], []
+        for s, exchanges in zip(self.strains, pool.exchanges):
+            idx = [k for k, r in enumerate(exchanges) if r.id in s.metabolite_uptake]
+            limited.append(idx)
+            limited_pool.append(np.array([pool.positions[exchanges[k].id] for k in idx], dtype=int))
+            vmax.append(np.array([s.metabolite_uptake[exchanges[k].id] for k in idx], dtype=float))
+            if isinstance(self.km, dict):
+                km.append(np.array([self.km.get(exchanges[k].id, 1.0) for k in idx], dtype=float))
+            else:
+                km.append(np.full(len(idx), float(self.km)))
+
+        # Carbon exchanges of each strain, for CUE
+        ex_indexes = [ExchangeIndex.from_model(s.model) for s in self.strains]
+        co2_indexes = [ex.co2_position(co2_rxn, definition) for ex in ex_indexes]
+        carbon_rxns = [[s.model.reactions.get_by_id(r) for r in ex.reaction_ids]
+                       for s, ex in zip(self.strains, ex_indexes)]
+
+        t = 0.0
+        fluxes = np.zeros(pool.offsets[-1])
+        growth = np.zeros(n_strains)
+        times, biomasses, concs, growths = [], [], [], []
+        carbon_fluxes = [[] for s in self.strains]
+
+        # Open a context on every model, so that all the bounds are reset at the end
+        models = [s.model for s in self.strains]
+        with ExitStack() as stack:
+            for model in models:
+                stack.enter_context(model)
+
+            # Only the Michaelis-Menten uptakes can take anything up
+            for exchanges in pool.exchanges:
+                for r in exchanges:
+                    set_active_bound(r, min(0.0, get_active_bound(r)))
+
+            while True:
+                for i, model in enumerate(models):
+                    exchanges = pool.exchanges[i]
+                    start, end = pool.offsets[i], pool.offsets[i + 1]
+
+                    # Update the uptake bounds from the current concentrations
+                    c = conc[limited_pool[i]]
+                    bounds = vmax[i] * c / (km[i] + c)
+                    for k, b in zip(limited[i], bounds):
+                        set_active_bound(exchanges[k], b)
+
+                    # Solve, no growth and no exchange if it is infeasible
+                    mu = model.slim_optimize()
+                    if np.isnan(mu):
+                        growth[i] = 0.0
+                        fluxes[start:end] = 0.0
+                        carbon_fluxes[i].append(np.zeros(len(carbon_rxns[i])))
+                    else:
+                        growth[i] = mu
+                        fluxes[start:end] = net_fluxes(exchanges)
+                        carbon_fluxes[i].append(net_fluxes(carbon_rxns[i]))
+
+                times.append(t)
+                biomasses.append(biomass.copy())
+                concs.append(conc)
+                growths.append(growth.copy())
+                if t >= t_end:
+                    break
+
+                # Pick the step size
+                dconc = pool.derivative(fluxes, biomass)
+                consumed = (dconc < 0) & (conc > 0)
+                dt = dt_max
+                if consumed.any():
+                    dt = min(dt, max_depletion * np.min(conc[consumed] / -dconc[consumed]))
+                dt = min(max(dt, dt_min), t_end - t)
+
+                # Take the step
+                conc = np.maximum(conc + dconc * dt, 0.0)
+                biomass = biomass * np.exp(growth * dt)
+                t += dt
+
+        # Collect the results
+        names = [s.name for s in self.strains]
+        self.time = np.array(times)
+        self.biomass = pd.DataFrame(np.array(biomasses), index=self.time, columns=names)
+        self.growth = pd.DataFrame(np.array(growths), index=self.time, columns=names)
+        self.concentrations = pd.DataFrame(np.array(concs), index=self.time, columns=pool.ids)
+        cue = {}
+        for name, ex, co2_index, c_v in zip(names, ex_indexes, co2_indexes, carbon_fluxes):
+            rcue, gge = cue_from_fluxes(np.array(c_v), ex.atoms, co2_index)
+            cue[name] = rcue if definition == 'rCUE' else gge
+        self.cue = pd.DataFrame(cue, index=self.time)
+
+        return self.cue
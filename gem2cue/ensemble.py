@@ -0,0 +1,144 @@
+"Distributions of CUE over many random, but reproducible, uptake rates"
+
+from typing import List, Union
+import warnings
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from gem2cue.utils import Strain, cue_from_fluxes, net_fluxes, set_active_bound
+
+
+def uptake_matrix(exchange_ids: List[str], n: int, seed: int = 0, low: float = 0.0, high: float = 1.0) -> np.ndarray:
+    """Draw uniform uptake values for a list of exchange reactions
+
+    Each exchange reaction has its own random stream, seeded from `seed` and
+    its ID, so the i-th value drawn for a metabolite is the same no matter
+    which strain it is drawn for or which other metabolites are drawn with it.
+
+    Args:
+    exchange_ids (list): IDs of the exchange reactions
+    n (int): Number of values to draw for each reaction
+    seed (int): Seed shared by all the reactions
+    low (float): Lowest value
+    high (float): Highest value
+
+    Returns:
+    uptakes (numpy.ndarray): Values drawn, one row per draw and one column per reaction
+    """
+    return _draw(_streams(exchange_ids, seed), n, low, high)
+
+
+def _streams(exchange_ids: List[str], seed: int) -> list:
+    "Random stream of each exchange reaction, seeded from `seed` and its ID"
+    # crc32 rather than hash(), which changes between Python sessions
+    return [np.random.default_rng([seed, zlib.crc32(rxn_id.encode())]) for rxn_id in exchange_ids]
+
+
+def _draw(streams: list, n: int, low: float, high: float) -> np.ndarray:
+    "Draw the next n values of each stream, drawing in pieces gives the same values as all at once"
+    uptakes = np.empty((n, len(streams)))
+    for j, rng in enumerate(streams):
+        uptakes[:, j] = rng.uniform(low, high, n)
+    return uptakes
+
+
+class EnsembleResult:
+    """
+    Summary of the CUE of each strain over an ensemble of uptake rates
+
+    Only one CUE per draw is kept while solving, never the solutions.
+
+    Inputs:
+    | cue <dict>: CUE of each draw (NaN where there is none), keyed by strain name
+    | quantiles <list>: Quantiles to report
+    | bin_edges <numpy.ndarray>: Edges of the histogram bins, values outside
+        them are counted in the first or last bin
+    """
+    def __init__(self, cue: dict, quantiles: List[float], bin_edges: np.ndarray):
+        self.cue = cue
+        self.bin_edges = bin_edges
+        names = list(cue)
+
+        # Draws that gave a CUE, and the quantiles of those
+        self.n_samples = pd.Series({s: len(c) for s, c in cue.items()}, index=names, dtype=int)
+        self.n_cue = pd.Series({s: int(np.sum(~np.isnan(c))) for s, c in cue.items()}, index=names, dtype=int)
+        self.quantiles = pd.DataFrame([np.nanquantile(c, quantiles) if np.any(~np.isnan(c))
+                                       else np.full(len(quantiles), np.nan) for c in cue.values()],
+                                      index=names, columns=quantiles)
+
+        # Counts in each bin, labeled by the left edge
+        counts = [np.histogram(np.clip(c[~np.isnan(c)], bin_edges[0], bin_edges[-1]), bin_edges)[0]
+                  for c in cue.values()]
+        self.histogram = pd.DataFrame(counts, index=names, columns=bin_edges[:-1])
+
+
+def uptake_ensemble(strains: List[Strain], n: int = 1000, seed: int = 0, components: List[str] = None,
+                    low: float = 0.0, high: float = 1.0, quantiles: List[float] = (0.05, 0.25, 0.5, 0.75, 0.95),
+                    bins: Union[int, np.ndarray] = 20, definition: str = 'rCUE', co2_rxn: str = 'EX_co2_e',
+                    ex_nomenclature: set = {'e'}, chunk_size: int = 1000) -> EnsembleResult:
+    """Distribution of CUE when the uptake of the medium components is drawn at random
+
+    In each draw, the uptake bound of each component of a strain's medium is
+    its bound in the medium times a value drawn by `uptake_matrix`, so the
+    same draw scales a metabolite the same way in every strain. The draws of a
+    strain are solved one after the other on one solver problem, only changing
+    the uptake bounds, and are made `chunk_size` at a time.
+
+    Args:
+    strains (list): List of Strain objects
+    n (int): Number of draws
+    seed (int): Seed of the draws, the same seed gives the same ensemble
+    components (list): Exchange reactions to draw the uptake of, defaults to
+        the whole medium of each strain. Those not in a strain's medium stay closed
+    low (float): Lowest fraction of the medium bound drawn
+    high (float): Highest fraction of the medium bound drawn
+    quantiles (list): Quantiles of CUE to report
+    bins (int or numpy.ndarray): Number of histogram bins between 0 and 1, or the bin edges
+    definition (str): What definition of CUE to use ('rCUE' or 'GGE')
+    co2_rxn (str): Name of the respiration reaction in the models
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    chunk_size (int): Number of draws made and solved at a time
+
+    Returns:
+    ensemble (EnsembleResult): Quantiles and histogram of CUE for each strain
+    """
+    if isinstance(bins, int):
+        bins = np.linspace(0, 1, bins + 1)
+
+    cue = {}
+    for strain in strains:
+        ex_index = strain.exchange_index(ex_nomenclature=ex_nomenclature)
+        # rCUE needs the respiration reaction, GGE does not
+        co2_index = ex_index.co2_position(co2_rxn, definition)
+        values = np.full(n, np.nan)
+
+        # Silence the per-draw solver warnings, infeasible draws have no CUE
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with strain.context() as model:
+                medium = model.medium
+                ids = [r for r in (components if components is not None else medium) if r in medium]
+                bounds = np.array([medium[r] for r in ids])
+                rxns = [model.reactions.get_by_id(r) for r in ids]
+                carbon = [model.reactions.get_by_id(r) for r in ex_index.reaction_ids]
+                streams = _streams(ids, seed)
+
+                for start in range(0, n, chunk_size):
+                    stop = min(start + chunk_size, n)
+                    draws = _draw(streams, stop - start, low, high) * bounds
+
+                    fluxes = np.full((stop - start, len(carbon)), np.nan)
+                    for k, draw in enumerate(draws):
+                        for rxn, bound in zip(rxns, draw):
+                            set_active_bound(rxn, bound)
+                        if not np.isnan(model.slim_optimize()):
+                            fluxes[k] = net_fluxes(carbon)
+
+                    rcue, gge = cue_from_fluxes(fluxes, ex_index.atoms, co2_index)
+                    values[start:stop] = rcue if definition == 'rCUE' else gge
+
+        cue[strain.name] = values
+
+    return EnsembleResult(cue, list(quantiles), bins)
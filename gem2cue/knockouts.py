@@ -0,0 +1,200 @@
+"Screening single and double deletions for their effect on CUE"
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import combinations, repeat
+from typing import List
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from gem2cue import profiling
+from gem2cue.utils import Strain, cue_from_fluxes, net_fluxes
+
+
+# Strain shipped to each worker process by `_init_worker`, so that the model
+# is pickled once per worker rather than once per chunk of knockouts
+_WORKER_STRAIN = None
+
+# Columns of the table returned by `knockout_screen`
+SCREEN_COLUMNS = ['knockout', 'status', 'growth', 'cue', 'gge']
+
+
+def _init_worker(strain: Strain):
+    "Store the strain in the worker process"
+    global _WORKER_STRAIN
+    _WORKER_STRAIN = strain
+
+
+def _get_basis(model) -> tuple:
+    "Status of the rows and columns of the model's solver problem, None if the solver is not GLPK"
+    if not model.solver.interface.__name__.startswith('optlang.glpk'):
+        return None
+    import swiglpk
+    problem = model.solver.problem
+    rows = [swiglpk.glp_get_row_stat(problem, i) for i in range(1, swiglpk.glp_get_num_rows(problem) + 1)]
+    cols = [swiglpk.glp_get_col_stat(problem, j) for j in range(1, swiglpk.glp_get_num_cols(problem) + 1)]
+    return rows, cols
+
+
+def _set_basis(model, basis: tuple):
+    "Start the next solve from a basis saved by `_get_basis`"
+    if basis is None:
+        return
+    import swiglpk
+    problem = model.solver.problem
+    rows, cols = basis
+    for i, stat in enumerate(rows, start=1):
+        swiglpk.glp_set_row_stat(problem, i, stat)
+    for j, stat in enumerate(cols, start=1):
+        swiglpk.glp_set_col_stat(problem, j, stat)
+
+
+def _screen_chunk(strain: Strain, kind: str, chunk: List[tuple], carbon_ids: List[str]) -> list:
+    """Solve a list of knockouts one after the other on the strain's model
+
+    The wild type is solved first, and each knockout only changes bounds
+    inside a model context, so the solver problem is kept and every knockout
+    is solved starting from the wild-type basis, whichever chunk it is in.
+
+    Args:
+    strain (Strain): Strain to knock genes or reactions out of
+    kind (str): 'gene' or 'reaction'
+    chunk (list): Knockouts, each a tuple of gene or reaction IDs
+    carbon_ids (list): Carbon exchange reactions to keep the fluxes of
+
+    Returns:
+    solutions (list): Status, growth and carbon exchange fluxes of each knockout
+    """
+    solutions = []
+    # Silence the per-knockout solver warnings, the status column has them
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with strain.context() as model:
+            targets = model.genes if kind == 'gene' else model.reactions
+            carbon = [model.reactions.get_by_id(r) for r in carbon_ids]
+            # Reactions of a compressed model were removed or merged
+            compression = strain.compression if kind == 'reaction' else None
+            # Solve the wild type, to start every knockout from its basis
+            model.slim_optimize()
+            basis = _get_basis(model)
+            for knockout in chunk:
+                with model:
+                    _set_basis(model, basis)
+                    for target in knockout:
+                        if compression is not None:
+                            target = compression.reactions[target][0]
+                            # A blocked reaction does not change anything
+                            if target is None:
+                                continue
+                        targets.get_by_id(target).knock_out()
+                    with profiling.phase('knockouts.solve', model):
+                        growth = model.slim_optimize()
+                    status = model.solver.status
+                    if np.isnan(growth):
+                        fluxes = np.full(len(carbon), np.nan)
+                    else:
+                        fluxes = net_fluxes(carbon)
+                solutions.append((status, growth, fluxes))
+    return solutions
+
+
+def _screen_worker_chunk(chunk: List[tuple], kind: str, carbon_ids: List[str]) -> list:
+    "Solve a list of knockouts on the strain shipped to this worker"
+    return _screen_chunk(_WORKER_STRAIN, kind, chunk, carbon_ids)
+
+
+def knockout_screen(strain: Strain, kind: str = 'gene', targets: List[str] = None, double: bool = False,
+                    workers: int = 1, chunk_size: int = 100, lethal_growth: float = 1e-6,
+                    co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'}) -> pd.DataFrame:
+    """Growth, CUE and GGE of single (and double) gene or reaction knockouts
+
+    The strain's model is never copied: every knockout is applied as bound
+    changes inside a model context, and solved starting from the wild-type
+    basis (with the GLPK solvers). The knockouts are split into chunks of `chunk_size` which are
+    solved over a pool of `workers` processes, each with its own copy of the
+    strain.
+
+    Reaction knockouts of a compressed strain (see `Strain.compress`) are given
+    with the IDs of the original reactions.
+
+    Double knockouts are only made of pairs of targets whose single knockouts
+    are not lethal, since removing a reaction can never raise growth.
+
+    Where the optimum is not unique (e.g. without growth), CUE is that of the
+    optimum reached from the wild-type basis, which may differ from solving the
+    knockout from scratch, but does not depend on `workers` or `chunk_size`.
+
+    Args:
+    strain (Strain): Strain to screen
+    kind (str): Whether to knock out genes ('gene') or reactions ('reaction')
+    targets (list): IDs of the genes or reactions to knock out, defaults to all of them
+    double (bool): Whether to also knock out every pair of non-lethal targets
+    workers (int): Number of worker processes, 1 runs everything in this process
+    chunk_size (int): Number of knockouts solved in a row by one worker
+    lethal_growth (float): Growth under which a knockout is lethal
+    co2_rxn (str): Name of the respiration reaction in the model
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+
+    Returns:
+    screen (pandas.DataFrame): One row per knockout, starting with the wild
+        type (an empty knockout), with the columns knockout (tuple of IDs),
+        status, growth, cue (rCUE) and gge
+    """
+    if kind not in ('gene', 'reaction'):
+        raise ValueError(f"kind must be 'gene' or 'reaction', not {kind!r}")
+
+    # Check the targets before starting any worker, the reactions of a
+    # compressed model are those of the original model
+    if kind == 'gene':
+        model_targets = [g.id for g in strain.model.genes]
+    elif strain.compression is not None:
+        model_targets = strain.compression.reaction_ids
+    else:
+        model_targets = [r.id for r in strain.model.reactions]
+    if targets is None:
+        targets = model_targets
+    known = set(model_targets)
+    missing = [t for t in targets if t not in known]
+    if missing:
+        raise KeyError(f'{kind.capitalize()}s not in the model: {missing}')
+
+    # Without the respiration reaction every knockout would have a CUE of 1
+    ex_index = strain.exchange_index(ex_nomenclature=ex_nomenclature)
+    co2_index = ex_index.co2_position(co2_rxn)
+    parallel = workers is not None and workers > 1
+
+    knockouts, solutions = [], []
+    # Profile the chunks in the workers if profiling is on here
+    profiled = profiling.get_profiler() is not None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(strain,)) if parallel else nullcontext() as pool:
+
+        def screen(batch):
+            "Solve a list of knockouts, in chunks"
+            chunks = [batch[i:i + chunk_size] for i in range(0, len(batch), chunk_size)]
+            if parallel:
+                results = pool.map(profiling.run_profiled, repeat(profiled), repeat(_screen_worker_chunk),
+                                   chunks, repeat(kind), repeat(ex_index.reaction_ids))
+            else:
+                results = ((_screen_chunk(strain, kind, c, ex_index.reaction_ids), None) for c in chunks)
+            knockouts.extend(batch)
+            for result, stats in results:
+                profiling.merge(stats)
+                solutions.extend(result)
+
+        # The wild type and the single knockouts
+        screen([()] + [(t,) for t in targets])
+
+        # Pairs of targets that are not lethal on their own
+        if double:
+            viable = [k[0] for k, (_, growth, _) in zip(knockouts[1:], solutions[1:])
+                      if not np.isnan(growth) and growth >= lethal_growth]
+            screen(list(combinations(viable, 2)))
+
+    # CUE and GGE of all the knockouts at once
+    status, growth, fluxes = zip(*solutions)
+    rcue, gge = cue_from_fluxes(np.array(fluxes), ex_index.atoms, co2_index)
+    return pd.DataFrame({'knockout': knockouts, 'status': status, 'growth': growth,
+                         'cue': rcue, 'gge': gge}, columns=SCREEN_COLUMNS)
@@ -0,0 +1,214 @@
+"Timing and counting the phases of strains and experiments"
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+import json
+import time
+from typing import Callable
+
+import numpy as np
+
+# Profiler the phases are recorded in, None when profiling is off
+_active = None
+
+# Returned by `phase` when profiling is off, so that it costs one check
+_NULL_PHASE = nullcontext()
+
+
+def _solver_iterations(model) -> int:
+    "Simplex iterations made so far on the model's solver problem, None if the solver does not report them"
+    if not model.solver.interface.__name__.startswith('optlang.glpk'):
+        return None
+    import swiglpk
+    return swiglpk.glp_get_it_cnt(model.solver.problem)
+
+
+class Profiler:
+    """
+    Timings of the phases of strains and experiments, and counters of their events
+
+    Phases are named after what they time, e.g. 'experiment.solve'. Every
+    duration is kept, so percentiles are exact. Each process has its own
+    profiler: the pools of `run_batch`, `run_files` and `knockout_screen` time
+    their tasks in the workers (see `run_profiled`) and merge them in here.
+
+    Inputs:
+    | hooks <list>: Callbacks called as `hook(name, seconds, info)` each time a
+        phase ends, `info` is a dict with what else is known about the phase
+        (e.g. the solver iterations of a solve)
+    """
+    def __init__(self, hooks: list = None):
+        self.timings = defaultdict(list)
+        self.counters = Counter()
+        self.hooks = list(hooks) if hooks else []
+
+    def add_hook(self, hook: Callable):
+        "Call `hook(name, seconds, info)` each time a phase ends"
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable):
+        self.hooks.remove(hook)
+
+    @contextmanager
+    def phase(self, name: str, model=None):
+        """Time a phase
+
+        Args:
+        name (str): Name of the phase
+        model (cobra.core.Model): Model solved in the phase, its solver
+            iterations are counted in 'solver.iterations'
+        """
+        iterations = _solver_iterations(model) if model is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            info = {}
+            if iterations is not None:
+                info['iterations'] = _solver_iterations(model) - iterations
+                self.counters['solver.iterations'] += info['iterations']
+            self.record(name, seconds, info)
+
+    def record(self, name: str, seconds: float, info: dict = None):
+        "Add the duration of a phase timed elsewhere, and call the hooks"
+        self.timings[name].append(seconds)
+        for hook in self.hooks:
+            hook(name, seconds, info or {})
+
+    def count(self, name: str, n: int = 1):
+        "Add to a counter, e.g. 'solution_cache.hit'"
+        self.counters[name] += n
+
+    def merge(self, stats: tuple):
+        """Add the timings and counters recorded by another profiler, e.g. in a worker process
+
+        Args:
+        stats (tuple): Timings and counters returned by `run_profiled`
+        """
+        timings, counters = stats
+        for name, seconds in timings.items():
+            for s in seconds:
+                self.record(name, s)
+        self.counters.update(counters)
+
+    def reset(self):
+        "Forget the timings and counters, keeping the hooks"
+        self.timings.clear()
+        self.counters.clear()
+
+    def stats(self, percentiles: tuple = (50, 99)) -> dict:
+        """Summary of the timings and counters
+
+        Args:
+        percentiles (tuple): Percentiles of the durations of each phase to report
+
+        Returns:
+        stats (dict): {'phases': {name: {'count', 'total', 'mean', 'max', 'p50',
+            'p99', ...}}, 'counters': {name: value}}, durations in seconds
+        """
+        phases = {}
+        for name, seconds in sorted(self.timings.items()):
+            seconds = np.array(seconds)
+            summary = {'count': len(seconds), 'total': float(seconds.sum()),
+                       'mean': float(seconds.mean()), 'max': float(seconds.max())}
+            for p, value in zip(percentiles, np.percentile(seconds, percentiles)):
+                summary[f'p{p:g}'] = float(value)
+            phases[name] = summary
+        return {'phases': phases, 'counters': dict(sorted(self.counters.items()))}
+
+    def to_json(self, path: str = None, percentiles: tuple = (50, 99)) -> str:
+        """Summary of the timings and counters as JSON (see `stats`)
+
+        Args:
+        path (str): File to write the JSON to, if any
+        percentiles (tuple): Percentiles of the durations of each phase to report
+
+        Returns:
+        stats (str): The JSON
+        """
+        stats = json.dumps(self.stats(percentiles), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(stats)
+        return stats
+
+
+def get_profiler() -> Profiler:
+    "The profiler phases are recorded in, None when profiling is off"
+    return _active
+
+
+def enable(profiler: Profiler = None) -> Profiler:
+    """Start recording phases
+
+    Args:
+    profiler (Profiler): Profiler to record in, defaults to a new one
+
+    Returns:
+    profiler (Profiler): The profiler recording
+    """
+    global _active
+    _active = profiler if profiler is not None else Profiler()
+    return _active
+
+
+def disable():
+    "Stop recording phases"
+    global _active
+    _active = None
+
+
+@contextmanager
+def profile(profiler: Profiler = None):
+    """Record the phases run inside the context
+
+    Ex. with profile() as profiler:
+            experiment.CUE()
+        print(profiler.to_json())
+    """
+    global _active
+    previous = _active
+    try:
+        yield enable(profiler)
+    finally:
+        _active = previous
+
+
+def phase(name: str, model=None):
+    "Time a phase in the active profiler, does nothing when profiling is off (see `Profiler.phase`)"
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name, model)
+
+
+def count(name: str, n: int = 1):
+    "Add to a counter of the active profiler, does nothing when profiling is off"
+    if _active is not None:
+        _active.counters[name] += n
+
+
+def merge(stats: tuple):
+    "Add the timings and counters of `run_profiled` to the active profiler, does nothing when profiling is off"
+    if _active is not None and stats is not None:
+        _active.merge(stats)
+
+
+def run_profiled(enabled: bool, function: Callable, *args):
+    """Run a function under a profiler of its own, e.g. as the task of a worker process
+
+    Args:
+    enabled (bool): Whether to profile, pass whether profiling is on where the task was made
+    function (callable): Function to run, with `args`
+
+    Returns:
+    result: What the function returned
+    stats (tuple): Timings and counters recorded while it ran, for `merge`,
+        None when not enabled
+    """
+    if not enabled:
+        return function(*args), None
+    profiler = Profiler()
+    with profile(profiler):
+        result = function(*args)
+    return result, (dict(profiler.timings), dict(profiler.counters))
@@ -0,0 +1,232 @@
+"Compact containers for the results of many Experiments"
+
+from array import array
+import glob
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class ExperimentResult:
+    "Results of an Experiment without the full cobra Solution"
+
+    __slots__ = ('objective_value', 'status', 'exchange_fluxes', 'reaction_ids', 'cue', 'gge')
+
+    def __init__(self, objective_value: float, status: str, exchange_fluxes: np.ndarray,
+                 reaction_ids: List[str], cue: float = None, gge: float = None):
+        """
+        objective_value: Objective value of the solution (growth rate)
+        status: Solver status
+        exchange_fluxes: Fluxes through the carbon exchange reactions, as float32
+        reaction_ids: IDs of the carbon exchange reactions, shared with the
+            strain's exchange index rather than copied per result
+        cue: rCUE
+        gge: GGE
+        """
+        self.objective_value = objective_value
+        self.status = status
+        self.exchange_fluxes = np.asarray(exchange_fluxes, dtype=np.float32)
+        self.reaction_ids = reaction_ids
+        self.cue = cue
+        self.gge = gge
+
+    def __repr__(self):
+        return f'<ExperimentResult {self.status} objective_value={self.objective_value} cue={self.cue} gge={self.gge}>'
+
+
+class ResultSet:
+    "Column-wise store of many ExperimentResults"
+
+    def __init__(self):
+        """
+        names: Name of each result (e.g. the strain)
+        status: Solver status of each result
+        objective_value, cue, gge: Arrays of doubles, NaN where missing
+        exchange_fluxes: float32 exchange fluxes of each result
+        reaction_ids: Reaction IDs of each result's exchange fluxes
+        """
+        self.names = []
+        self.status = []
+        self.objective_value = array('d')
+        self.cue = array('d')
+        self.gge = array('d')
+        self.exchange_fluxes = []
+        self.reaction_ids = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, name: str, result: ExperimentResult):
+        """Add the result of one Experiment
+
+        Args:
+        name (str): Name of the result, e.g. the strain name
+        result (ExperimentResult): Compact result of the Experiment
+        """
+        self.names.append(name)
+        self.status.append(result.status)
+        self.objective_value.append(np.nan if result.objective_value is None else result.objective_value)
+        self.cue.append(np.nan if result.cue is None else result.cue)
+        self.gge.append(np.nan if result.gge is None else result.gge)
+        self.exchange_fluxes.append(result.exchange_fluxes)
+        self.reaction_ids.append(result.reaction_ids)
+
+    def to_pandas(self, fluxes: bool = False) -> pd.DataFrame:
+        """Make a table of the results
+
+        Args:
+        fluxes (bool): Whether to add a column for each exchange reaction, NaN
+            for results from models without it
+
+        Returns:
+        results (pandas.DataFrame): One row per result
+        """
+        table = pd.DataFrame({'name': self.names,
+                              'status': pd.Categorical(self.status),
+                              'objective_value': np.frombuffer(self.objective_value, dtype=float),
+                              'cue': np.frombuffer(self.cue, dtype=float),
+                              'gge': np.frombuffer(self.gge, dtype=float)})
+        if fluxes:
+            flux_table = pd.DataFrame([dict(zip(ids, f)) for ids, f in zip(self.reaction_ids, self.exchange_fluxes)],
+                                      dtype=np.float32)
+            table = pd.concat([table, flux_table], axis=1)
+        return table
+
+
+# Columns of the `results-NNNNN.csv` files
+RESULT_FILE_COLUMNS = ['strain', 'medium', 'status', 'objective_value', 'cue', 'gge']
+
+
+def _medium_label(medium) -> str:
+    return '' if medium is None else str(medium)
+
+
+def _chunk_path(directory: str, kind: str, number: int) -> str:
+    "Path of a chunk, numbers past 99999 just get more digits"
+    return os.path.join(directory, f'{kind}-{number:05d}.csv')
+
+
+def _chunk_files(directory: str, kind: str) -> List[str]:
+    "Chunks of a kind in the order they were written, whatever the number of digits"
+    files = [f for f in glob.glob(os.path.join(directory, f'{kind}-*.csv'))
+             if os.path.basename(f)[len(kind) + 1:-4].isdigit()]
+    return sorted(files, key=_chunk_number)
+
+
+def _chunk_number(path: str) -> int:
+    return int(os.path.basename(path).split('-')[1].split('.')[0])
+
+
+def _write_atomic(table: pd.DataFrame, path: str):
+    "Write a CSV under a temporary name, then rename it into place"
+    tmp_path = path + '.tmp'
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+class ResultWriter:
+    """Stream results to a directory of CSV chunks as they finish
+
+    Results are written every `chunk_size` results as two files:
+    `results-NNNNN.csv` with one row per result (strain, medium, status,
+    objective_value, cue, gge), and `fluxes-NNNNN.csv` with the exchange fluxes
+    in long format (strain, medium, reaction, flux). Each file is written under
+    a temporary name and then renamed, so `read_results` only ever sees
+    complete chunks, even while a campaign is still writing.
+
+    Opening a directory that already has chunks picks up where it left off:
+    `is_done` is True for every strain/medium pair already written, and new
+    chunks are numbered after the existing ones.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = 1):
+        """
+        directory: Directory to write the chunks to, made if it does not exist
+        chunk_size: Number of results per chunk. By default every result is
+            written as soon as it finishes; larger chunks make fewer files, but
+            results still in the buffer are lost if the process dies
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        # Checkpoint: the strain/medium pairs already on disk
+        existing = _chunk_files(directory, 'results')
+        self.done = set()
+        for f in existing:
+            table = pd.read_csv(f, usecols=['strain', 'medium'], dtype=str, keep_default_na=False)
+            self.done.update(zip(table['strain'], table['medium']))
+        self.n_chunks = max([_chunk_number(f) for f in existing], default=-1) + 1
+
+        self._rows = []
+        self._fluxes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_done(self, strain: str, medium: str = None) -> bool:
+        "Whether the result for a strain in a medium has been written already"
+        return (str(strain), _medium_label(medium)) in self.done
+
+    def write(self, strain: str, result: ExperimentResult, medium: str = None):
+        """Add the result of one Experiment
+
+        Args:
+        strain (str): Name of the strain
+        result (ExperimentResult): Compact result of the Experiment
+        medium (str): Name of the medium, if there is one
+        """
+        strain, medium = str(strain), _medium_label(medium)
+        self._rows.append({'strain': strain, 'medium': medium, 'status': result.status,
+                           'objective_value': result.objective_value, 'cue': result.cue, 'gge': result.gge})
+        self._fluxes.extend((strain, medium, r, f) for r, f in zip(result.reaction_ids, result.exchange_fluxes))
+        self.done.add((strain, medium))
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        "Write the buffered results to a new chunk"
+        if not self._rows:
+            return
+        results = pd.DataFrame(self._rows, columns=RESULT_FILE_COLUMNS)
+        fluxes = pd.DataFrame(self._fluxes, columns=['strain', 'medium', 'reaction', 'flux'])
+        # Fluxes first, so a results chunk never points to missing fluxes
+        _write_atomic(fluxes, _chunk_path(self.directory, 'fluxes', self.n_chunks))
+        _write_atomic(results, _chunk_path(self.directory, 'results', self.n_chunks))
+        self.n_chunks += 1
+        self._rows = []
+        self._fluxes = []
+
+    def close(self):
+        self.flush()
+
+
+def read_results(directory: str, fluxes: bool = False) -> pd.DataFrame:
+    """Read the chunks written by a ResultWriter, also while it is still writing
+
+    Args:
+    directory (str): Directory the ResultWriter writes to
+    fluxes (bool): Whether to read the exchange fluxes instead of the summary
+
+    Returns:
+    results (pandas.DataFrame): Summary with one row per result, or the fluxes
+        in long format with one row per result and exchange reaction
+    """
+    if fluxes:
+        files = [f for f in _chunk_files(directory, 'fluxes')
+                 if os.path.exists(_chunk_path(directory, 'results', _chunk_number(f)))]
+        columns = ['strain', 'medium', 'reaction', 'flux']
+    else:
+        files = _chunk_files(directory, 'results')
+        columns = RESULT_FILE_COLUMNS
+    if not files:
+        return pd.DataFrame(columns=columns)
+    tables = [pd.read_csv(f, dtype={'strain': str, 'medium': str}, keep_default_na=False,
+                          na_values={c: [''] for c in columns if c not in ('strain', 'medium')})
+              for f in files]
+    return pd.concat(tables, ignore_index=True)
@@ -1,6 +1,8 @@
 import cobra
 import numpy as np
 
+from gem2cue.ensemble import uptake_matrix
+
 class Strain:
     """
     Object for single strain
@@ -19,8 +21,11 @@ class Strain:
             'EX_pi_e': 1}
         
         * If not provided, defaults to random values between 0 and 1
+    | seed <int>: Seed for the random uptake rates. Strains given the same seed get the same
+        rate for each metabolite they share (see `gem2cue.ensemble.uptake_matrix`)
     """
-    def __init__(self, name: str, model: cobra.Model, metabolite_uptake: dict=None, gc_content: float=None, genome_length: int=None):
+    def __init__(self, name: str, model: cobra.Model, metabolite_uptake: dict=None, gc_content: float=None, genome_length: int=None,
+                 seed: int=None):
         self.name = name
         self.model = model
         self.gc_content = gc_content
@@ -29,10 +34,15 @@ class Strain:
         # Handle metabolite uptake
         # If not defined, assign random numbers 
         #   (like surfinFBA does: https://github.com/jdbrunner/surfin_fba/blob/1566282ddb628be3914e54b6ccd4468958338699/surfinFBA/Surfin_FBA.py#L350)
-        #   TODO: Metabolite uptakes should be same across strains (like surfinFBA does, except they also only take the intersection across strains...)
+        #   With a seed, metabolite uptakes are the same across strains (like surfinFBA does, except they also only take the intersection across strains...)
         if not metabolite_uptake:
-            metabolite_uptake = np.random.rand(len(self.model.medium))
+            if seed is None:
+                rates = np.random.rand(len(self.model.medium))
+            else:
+                rates = uptake_matrix(list(self.model.medium), 1, seed)[0]
+            metabolite_uptake = dict(zip(self.model.medium.keys(), rates))
         
         # If missing reactions, through error
         if metabolite_uptake.keys() != self.model.medium.keys():
-            raise KeyError('If providing uptake rates, uptake for all metabolites in `model.medium` must be specified')
\ No newline at end of file
+            raise KeyError('If providing uptake rates, uptake for all metabolites in `model.medium` must be specified')
+        self.metabolite_uptake = metabolite_uptake
\ No newline at end of file
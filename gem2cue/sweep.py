@@ -0,0 +1,97 @@
+"Sweeping CUE over many media with one live solver problem per strain"
+
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from gem2cue.utils import Media, Strain, cue_from_fluxes, get_active_bound, net_fluxes, set_active_bound
+
+
+def sweep_strain(strain: Strain, media: List[Media], co2_rxn: str = 'EX_co2_e',
+                 ex_nomenclature: set = {'e'}, definition: str = 'rCUE'):
+    """Solve one strain in each medium, changing only the bounds that differ
+
+    The media are applied inside a model context, one after the other, so the
+    solver problem is built once and each solve starts from the basis of the
+    previous one. Exchange reactions that are not in a medium are closed for
+    uptake, like `cobra.Model.medium` does. The model is left as it was.
+
+    Args:
+    strain (Strain): Strain to sweep
+    media (list): List of Media objects
+    co2_rxn (str): Name of the respiration reaction in the model
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    definition (str): CUE definition that will be used, rCUE needs `co2_rxn`
+        to be one of the carbon exchange reactions
+
+    Returns:
+    growth (numpy.ndarray): Objective value in each medium, NaN if infeasible
+    rcue (numpy.ndarray): rCUE in each medium
+    gge (numpy.ndarray): GGE in each medium
+    """
+    model = strain.model
+    ex_index = strain.exchange_index(ex_nomenclature=ex_nomenclature)
+    co2_index = ex_index.co2_position(co2_rxn, definition)
+    carbon_rxns = [model.reactions.get_by_id(r) for r in ex_index.reaction_ids]
+
+    # Uptake bound of each exchange reaction, as the model has it now
+    exchanges = list(model.exchanges)
+    positions = {r.id: i for i, r in enumerate(exchanges)}
+    original = np.array([get_active_bound(r) for r in exchanges])
+    closed = np.minimum(0.0, original)
+
+    growth = np.full(len(media), np.nan)
+    fluxes = np.full((len(media), len(carbon_rxns)), np.nan)
+    with model:
+        current = original
+        for j, medium in enumerate(media):
+            # Uptake bounds for this medium, dropping anything that is not an exchange
+            target = closed.copy()
+            for rxn_id, bound in medium.media.items():
+                if rxn_id in positions:
+                    target[positions[rxn_id]] = bound
+
+            # Only touch the bounds that changed since the last medium
+            for k in np.flatnonzero(target != current):
+                set_active_bound(exchanges[k], target[k])
+            current = target
+
+            # Solve and keep only the exchange fluxes
+            value = model.slim_optimize()
+            if not np.isnan(value):
+                growth[j] = value
+                fluxes[j] = net_fluxes(carbon_rxns)
+
+    rcue, gge = cue_from_fluxes(fluxes, ex_index.atoms, co2_index)
+    return growth, rcue, gge
+
+
+def media_sweep(strains: List[Strain], media: Union[dict, list], definition: str = 'rCUE',
+                co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'}) -> pd.DataFrame:
+    """Calculate CUE for every strain in every medium
+
+    Args:
+    strains (list): List of Strain objects
+    media (dict or list): Media objects, either as a dictionary with the names
+        of the media as keys or as a list
+    definition (str): What definition to use ('rCUE' or 'GGE')
+    co2_rxn (str): Name of the respiration reaction in the models
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+
+    Returns:
+    cue (pandas.DataFrame): CUE grid with one row per strain and one column per
+        medium, NaN where the strain cannot grow or takes up no carbon
+    """
+    if isinstance(media, dict):
+        names, media = list(media.keys()), list(media.values())
+    else:
+        names = list(range(len(media)))
+
+    grid = []
+    for strain in strains:
+        growth, rcue, gge = sweep_strain(strain, media, co2_rxn=co2_rxn, ex_nomenclature=ex_nomenclature,
+                                         definition=definition)
+        grid.append(rcue if definition == 'rCUE' else gge)
+
+    return pd.DataFrame(grid, index=[s.name for s in strains], columns=names)
@@ -1,65 +1,609 @@
 "Class objects for running dFBA- copied from Michael's dFBA package"
 
-from typing import List
+from contextlib import contextmanager
+from itertools import product
+import os
+from typing import List, Union
 import cobra
+from cobra.flux_analysis import flux_variability_analysis
+from cobra.util.array import create_stoichiometric_matrix
+from cobra.util.solver import fix_objective_as_constraint, linear_reaction_coefficients
 import numpy as np
 import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
 import warnings
 
+from gem2cue import profiling
+from gem2cue.cache import SolutionCache, load_model, structure_hash
+from gem2cue.compression import Compression, compress_model
+from gem2cue.results import ExperimentResult
+
 
 class Media:
     "Environmental media for a Community over time"
 
-    def __init__(self, media: dict = None):
+    def __init__(self, media: dict = None, name: str = None):
         """
         media: A dictionary of cobrapy exchange reactions
+        name: Name of the medium, used to label results
         """
         self.media = media
+        self.name = name
+
+
+class ExchangeIndex:
+    "Exchange reactions of a model and the number of atoms of an element each one carries"
+
+    def __init__(self, reaction_ids: List[str], atoms: np.ndarray):
+        """
+        reaction_ids: IDs of the exchange reactions with the atom of interest
+        atoms: Number of atoms associated with each of the exchange reactions
+        positions: Position of each reaction ID in `reaction_ids`
+        """
+        self.reaction_ids = reaction_ids
+        self.atoms = atoms
+        self.positions = {r: i for i, r in enumerate(reaction_ids)}
+
+    @classmethod
+    def from_model(cls, model: cobra.core.Model, atom: str = 'C', ex_nomenclature: set = {'e'}):
+        """Scan a model for the exchange reactions carrying an atom
+
+        Args:
+        model (cobra.core.Model): Model to scan
+        atom (str): Atom of interest
+        ex_nomenclature (set): Compartment(s) the exchange reactions are in
+
+        Returns:
+        ExchangeIndex
+        """
+        ex_atoms = {r.id: m.elements[atom] for m in model.metabolites for r in m.reactions if atom in m.elements if r.compartments == ex_nomenclature}
+        return cls(list(ex_atoms.keys()), np.array(list(ex_atoms.values()), dtype=float))
+
+    def position(self, rxn_id: str):
+        "Position of a reaction in the index (e.g. the CO2 exchange), None if it is not in it"
+        return self.positions.get(rxn_id)
+
+    def co2_position(self, co2_rxn: str, definition: str = 'rCUE'):
+        """Position of the respiration reaction, checking it is there when it is needed
+
+        Args:
+        co2_rxn (str): Name of the respiration reaction
+        definition (str): CUE definition, rCUE needs the respiration reaction
+
+        Returns:
+        co2_index (int): Position of the reaction, None if it is not in the index
+            and the definition does not need it
+        """
+        co2_index = self.positions.get(co2_rxn)
+        if co2_index is None and definition == 'rCUE':
+            raise KeyError(f'{co2_rxn} is not one of the carbon exchange reactions of the model')
+        return co2_index
+
+    def as_dict(self) -> dict:
+        "Dictionary with the reaction IDs as keys and the number of atoms as values"
+        return dict(zip(self.reaction_ids, self.atoms.tolist()))
+
+
+class ElementMatrix:
+    "Composition of the exchange reactions of a model in several elements"
+
+    def __init__(self, reaction_ids: List[str], elements: List[str], matrix: sparse.csr_matrix):
+        """
+        reaction_ids: IDs of the exchange reactions carrying any of the elements
+        elements: Elements of interest
+        matrix: Sparse (exchange reactions x elements) matrix with the number
+            of atoms of each element moved per unit of flux
+        positions: Position of each reaction ID in `reaction_ids`
+        """
+        self.reaction_ids = reaction_ids
+        self.elements = list(elements)
+        self.matrix = matrix
+        self.positions = {r: i for i, r in enumerate(reaction_ids)}
+
+    @classmethod
+    def from_model(cls, model: cobra.core.Model, elements: tuple = ('C', 'N', 'P', 'S'),
+                   ex_nomenclature: set = {'e'}):
+        """Build the matrix from the metabolite formulas of a model
+
+        Each entry counts atoms that leave the cell per unit of flux, so for an
+        exchange reaction 'met <=>' it is the number of atoms in 'met' and uptake
+        (negative flux) brings them in, as in `ExchangeIndex`.
+
+        Args:
+        model (cobra.core.Model): Model to scan
+        elements (tuple): Elements of interest
+        ex_nomenclature (set): Compartment(s) the exchange reactions are in
+
+        Returns:
+        ElementMatrix
+        """
+        reaction_ids, rows, cols, values = [], [], [], []
+        for r in model.reactions:
+            if r.compartments != ex_nomenclature:
+                continue
+            counts = np.zeros(len(elements))
+            for m, coef in r.metabolites.items():
+                counts -= coef * np.array([m.elements.get(e, 0) for e in elements], dtype=float)
+            if counts.any():
+                for j in np.flatnonzero(counts):
+                    rows.append(len(reaction_ids))
+                    cols.append(j)
+                    values.append(counts[j])
+                reaction_ids.append(r.id)
+        matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(reaction_ids), len(elements)))
+        return cls(reaction_ids, elements, matrix)
+
+    def position(self, rxn_id: str):
+        "Position of a reaction in the matrix (e.g. the CO2 exchange), None if it is not in it"
+        return self.positions.get(rxn_id)
+
+
+def _structure_signature(model: cobra.core.Model) -> tuple:
+    """Cheap signature of a model's structure, without walking the model
+
+    Changes when reactions or metabolites are added or removed, but not when
+    the stoichiometry or formulas are edited in place (see `Strain.invalidate_indexes`).
+    """
+    reactions, metabolites = model.reactions, model.metabolites
+    last = id(reactions[-1]) if len(reactions) else None
+    return (id(reactions), len(reactions), last, id(metabolites), len(metabolites))
+
+
+def cue_from_fluxes(fluxes: np.ndarray, atoms: np.ndarray, co2_index: int = None):
+    """Calculate rCUE and GGE for many sets of exchange fluxes in one pass
+
+    Uses the same definitions as `Experiment.CUE`, with uptake as negative flux:
+    rCUE = 1 - |CO2| / uptake C, where uptake C leaves out the CO2 exchange, and
+    GGE = (uptake C - secretion C) / uptake C over all the carbon exchanges.
+
+    Args:
+    fluxes (numpy.ndarray): Exchange fluxes, one row per condition/solution and
+        one column per exchange reaction (n_conditions x n_exchanges)
+    atoms (numpy.ndarray): Number of C atoms in each exchange reaction (n_exchanges)
+    co2_index (int): Column of the CO2 exchange reaction, None if there is none
+
+    Returns:
+    rcue (numpy.ndarray): rCUE of each row, NaN where there is no uptake
+    gge (numpy.ndarray): GGE of each row, NaN where there is no uptake
+    """
+    fluxes = np.atleast_2d(np.asarray(fluxes, dtype=float))
+    # Carbon fluxes, flipped so that uptake is positive
+    c_fluxes = fluxes * -np.asarray(atoms, dtype=float)
+    c_uptake = np.where(c_fluxes > 0, c_fluxes, 0)
+
+    # Respiration and uptake without the CO2 exchange
+    if co2_index is None:
+        co2 = np.zeros(len(fluxes))
+        uptake = c_uptake.sum(axis=1)
+    else:
+        co2 = fluxes[:, co2_index]
+        uptake = c_uptake.sum(axis=1) - c_uptake[:, co2_index]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rcue = np.where(uptake == 0, np.nan, 1 - np.abs(co2 / uptake))
+        gge = c_fluxes.sum(axis=1) / c_uptake.sum(axis=1)
+
+    return rcue, gge
+
+
+def use_efficiency_from_fluxes(fluxes: np.ndarray, element_matrix: ElementMatrix, co2_index: int = None) -> np.ndarray:
+    """Calculate the use efficiency of every element for many sets of exchange fluxes
+
+    Uptake and secretion of all the elements come out of one sparse product.
+    Each element's efficiency is (uptake - secretion) / uptake, like GGE, except
+    for carbon when the CO2 exchange is given, which uses rCUE as in `cue_from_fluxes`.
+
+    Args:
+    fluxes (numpy.ndarray): Exchange fluxes, one row per condition/solution and
+        one column per reaction of the element matrix (n_conditions x n_exchanges)
+    element_matrix (ElementMatrix): Composition of the exchange reactions
+    co2_index (int): Position of the CO2 exchange reaction in the element matrix
+
+    Returns:
+    efficiency (numpy.ndarray): Use efficiency of each element (n_conditions x
+        n_elements), NaN where there is no uptake of that element
+    """
+    fluxes = np.atleast_2d(np.asarray(fluxes, dtype=float))
+    n = len(fluxes)
+
+    # Uptake (negative flux) and secretion (positive flux) of every element at once
+    in_out = (element_matrix.matrix.T @ np.vstack([np.maximum(-fluxes, 0), np.maximum(fluxes, 0)]).T).T
+    uptake, secretion = in_out[:n], in_out[n:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        efficiency = np.where(uptake == 0, np.nan, (uptake - secretion) / uptake)
+
+        # rCUE for carbon: only respiration is waste, and CO2 uptake does not count
+        if co2_index is not None and 'C' in element_matrix.elements:
+            c = element_matrix.elements.index('C')
+            co2 = fluxes[:, co2_index]
+            c_uptake = uptake[:, c] - np.maximum(-co2, 0) * element_matrix.matrix[co2_index, c]
+            efficiency[:, c] = np.where(c_uptake == 0, np.nan, 1 - np.abs(co2 / c_uptake))
+
+    return efficiency
+
+
+def get_active_bound(reaction: cobra.Reaction) -> float:
+    "Bound of an exchange reaction in the direction of uptake, as in `cobra.Model.medium`"
+    if reaction.reactants:
+        return -reaction.lower_bound
+    return reaction.upper_bound
+
+
+def set_active_bound(reaction: cobra.Reaction, bound: float):
+    "Set the bound of an exchange reaction in the direction of uptake, as in `cobra.Model.medium`"
+    if reaction.reactants:
+        reaction.lower_bound = -bound
+    elif reaction.products:
+        reaction.upper_bound = bound
+
+
+def net_fluxes(reactions: list) -> np.ndarray:
+    "Net flux through each reaction in the last solve of its model, without building a Solution"
+    return np.array([r.forward_variable.primal - r.reverse_variable.primal for r in reactions])
+
+
+def _linear_value(coefs: dict, fluxes: dict) -> float:
+    "Value of a linear combination of reaction fluxes"
+    return sum(c * fluxes[r] for r, c in coefs.items())
+
+
+def _fractional_range(model: cobra.core.Model, num: dict, den: dict, start: float,
+                      tol: float = 1e-9, max_iter: int = 100) -> tuple:
+    """Minimum and maximum of a ratio of two linear functions of the fluxes
+
+    Uses Dinkelbach's algorithm: for the maximum, repeatedly maximize
+    num - lambda * den and set lambda to the ratio at the new optimum, until
+    num - lambda * den can no longer be made positive (and the other way round
+    for the minimum). Only the objective coefficients change between solves, so
+    one solver problem is used throughout. The denominator must be positive
+    over the feasible space.
+
+    Args:
+    model (cobra.core.Model): Model with its constraints in place, changed
+        objective is left for the caller's context to undo
+    num (dict): Coefficient of each reaction's flux in the numerator
+    den (dict): Coefficient of each reaction's flux in the denominator
+    start (float): Ratio at a feasible point
+    tol (float): Convergence tolerance on num - lambda * den
+    max_iter (int): Most solves per direction
+
+    Returns:
+    low, high (float): Minimum and maximum of num / den
+    """
+    rxns = {r: model.reactions.get_by_id(r) for r in set(num) | set(den)}
+    bounds = []
+    for direction in ('min', 'max'):
+        ratio = start
+        model.objective = model.problem.Objective(0, direction=direction)
+        for _ in range(max_iter):
+            # Set the objective num - ratio * den on the split flux variables
+            coefs = {}
+            for r, rxn in rxns.items():
+                c = num.get(r, 0) - ratio * den.get(r, 0)
+                coefs[rxn.forward_variable] = c
+                coefs[rxn.reverse_variable] = -c
+            model.objective.set_linear_coefficients(coefs)
+            model.slim_optimize(error_value=None)
+
+            # Stop once the ratio cannot be improved
+            fluxes = {r: rxn.forward_variable.primal - rxn.reverse_variable.primal for r, rxn in rxns.items()}
+            gap = _linear_value(num, fluxes) - ratio * _linear_value(den, fluxes)
+            if (direction == 'max' and gap <= tol) or (direction == 'min' and gap >= -tol):
+                break
+            ratio = _linear_value(num, fluxes) / _linear_value(den, fluxes)
+        bounds.append(ratio)
+    return tuple(bounds)
+
+
+def _interval_ratio(num: tuple, den: tuple) -> tuple:
+    "Range of x / y for x and y in two intervals, with y positive"
+    corners = [n / d for n in num for d in den]
+    return min(corners), max(corners)
+
+
+def _bound_directions(S: sparse.csc_matrix, free: np.ndarray, moved: np.ndarray, steps: np.ndarray,
+                      tol: float = 1e-9) -> tuple:
+    """Change of the fluxes per unit change of the bounds of reactions at a bound
+
+    With every reaction at a bound kept there, except the one whose bound is
+    moved, the reactions strictly between their bounds must balance the change:
+    S_free dv_free = -S_k dv_k. All the moved bounds are solved at once, by
+    least squares through one sparse LU factorization of the augmented system
+    [[I, S_free], [S_free^T, 0]]. At a vertex of the flux space the free
+    reactions are basic, so their columns are independent and the system is
+    nonsingular; if it is singular (a degenerate or non-vertex solution), the
+    change is not unique and no direction is used.
+
+    Args:
+    S (scipy.sparse.csc_matrix): Stoichiometric matrix
+    free (numpy.ndarray): Columns of the reactions strictly between their bounds
+    moved (numpy.ndarray): Columns of the reactions whose bound is moved
+    steps (numpy.ndarray): Change of each moved reaction's flux per unit change of its bound
+    tol (float): Tolerance for the balance and for a pivot being zero
+
+    Returns:
+    directions (numpy.ndarray): Change of every flux (columns) for each moved bound (rows)
+    valid (numpy.ndarray): Whether each direction balances and is unique
+    """
+    directions = np.zeros((len(moved), S.shape[1]))
+    directions[np.arange(len(moved)), moved] = steps
+    valid = np.zeros(len(moved), dtype=bool)
+    if not len(moved):
+        return directions, valid
+
+    S_free = S[:, free]
+    n_rows = S.shape[0]
+    augmented = sparse.bmat([[sparse.identity(n_rows), S_free], [S_free.T, None]], format='csc')
+    try:
+        lu = splu(augmented)
+    except RuntimeError:
+        return directions, valid
+    pivots = np.abs(lu.U.diagonal())
+    if pivots.min(initial=np.inf) <= tol * pivots.max(initial=0):
+        return directions, valid
+
+    # The residual comes first in the solution, and has to be zero
+    rhs = -(S[:, moved] @ sparse.diags(steps)).toarray()
+    solution = lu.solve(np.vstack([rhs, np.zeros((len(free), len(moved)))]))
+    valid = np.abs(solution[:n_rows]).max(axis=0) <= tol * max(1.0, np.abs(rhs).max(initial=0))
+    directions[:, free] = solution[n_rows:].T
+    return directions, valid
 
 
 class Strain:
     "A model and it's associated metadata"
 
-    def __init__(self, name: str, model: cobra.core.Model, metadata: dict = None):
+    def __init__(self, name: str, model: Union[cobra.core.Model, str], metadata: dict = None, copy: bool = True):
         """
         name:
-        model:
+        model: A cobra model, or the path to an SBML file which is read through
+            the model cache (see `gem2cue.cache.load_model`)
         gc_content:
         genome_length:
+        copy: Whether the strain gets its own copy of the model. If False, the
+            model is shared with whoever else uses it: the medium is kept on the
+            strain and only applied inside `context()`, and the model is copied
+            by `own_model()` before its structure is changed.
         """
         self.name = name
-        self.model = model.copy()
+        if isinstance(model, (str, os.PathLike)):
+            # A model read from a file belongs to this strain only
+            self.model = load_model(model)
+            self.shared = False
+        else:
+            if copy:
+                with profiling.phase('strain.copy'):
+                    model = model.copy()
+            self.model = model
+            self.shared = not copy
         self.metadata = metadata
+        # Medium of a strain with a shared model, None to use the model's own
+        self.medium = None
+        # Name of the last Media given to `update_medium`
+        self.medium_name = None
+        # How the model was compressed by `compress()`, None if it was not
+        self.compression = None
+        # Indexes derived from the model structure, see `_cached_index`
+        self._indexes = {}
+        self._index_signature = None
 
     def update_medium(self, new_medium: Media):
-        clean_media = {i: v for i, v in new_medium.media.items() if i in self.model.exchanges}
-        self.model.medium = clean_media
+        with profiling.phase('strain.update_medium'):
+            # Look the exchange reactions up once, rather than once per medium component
+            exchange_ids = {r.id for r in self.model.exchanges}
+            clean_media = {i: v for i, v in new_medium.media.items() if i in exchange_ids}
+            self.medium_name = new_medium.name
+            # Leave a shared model alone, the medium is applied in `context()`
+            if self.shared:
+                self.medium = clean_media
+            else:
+                self.model.medium = clean_media
+
+    @contextmanager
+    def context(self):
+        """Model of the strain with its medium applied
+
+        Any change made to the model inside the context, including the medium
+        of a strain with a shared model, is undone on exit.
+
+        Ex. with strain.context() as model:
+                solution = model.optimize()
+        """
+        with self.model as model:
+            if self.medium is not None:
+                with profiling.phase('strain.medium'):
+                    model.medium = self.medium
+            yield model
+
+    def own_model(self) -> cobra.core.Model:
+        """Copy a shared model so that its structure can be changed
+
+        Call this before adding or removing reactions, metabolites or genes. The
+        strain's medium is applied to the copy. Does nothing if the strain
+        already has its own model.
+
+        Returns:
+        model (cobra.core.Model): The strain's own model
+        """
+        if self.shared:
+            with profiling.phase('strain.copy'):
+                self.model = self.model.copy()
+            self.shared = False
+            if self.medium is not None:
+                self.model.medium = self.medium
+                self.medium = None
+        return self.model
+
+    def compress(self, keep: List[str] = None) -> Compression:
+        """Shrink the model before solving it many times (see `gem2cue.compression.compress_model`)
+
+        Blocked reactions are removed and coupled reaction chains are merged,
+        leaving the exchange and objective reactions as they are, so CUE is
+        unchanged. Experiments report the fluxes of the original reactions. A
+        shared model is copied first.
+
+        Args:
+        keep (list): IDs of other reactions to leave as they are
+
+        Returns:
+        compression (Compression): How to get the original fluxes back
+        """
+        if self.compression is not None:
+            raise ValueError(f'The model of {self.name} is already compressed')
+        model = self.own_model()
+        with profiling.phase('strain.compress'):
+            self.compression = compress_model(model, keep)
+        # Merging reactions edits their stoichiometry in place
+        self.invalidate_indexes()
+        return self.compression
+
+    def _cached_index(self, key: tuple, build):
+        """Return an index derived from the model, building it only when needed
+
+        All cached indexes are dropped when reactions or metabolites are added
+        to or removed from the model, see `_structure_signature`.
+
+        Args:
+        key (tuple): Key identifying the index
+        build (callable): Function building the index from the model
+        """
+        signature = _structure_signature(self.model)
+        if signature != self._index_signature:
+            self.invalidate_indexes()
+            self._index_signature = signature
+        if key not in self._indexes:
+            profiling.count('strain.index.miss')
+            with profiling.phase('strain.index'):
+                self._indexes[key] = build(self.model)
+        else:
+            profiling.count('strain.index.hit')
+        return self._indexes[key]
+
+    def invalidate_indexes(self):
+        "Drop the cached indexes, e.g. after changing stoichiometry or metabolite formulas in place"
+        self._indexes = {}
+        self._index_signature = None
+
+    def exchange_index(self, atom: str = 'C', ex_nomenclature: set = {'e'}) -> ExchangeIndex:
+        """Exchange reactions carrying an atom, computed once per model structure
+
+        Args:
+        atom (str): Atom of interest
+        ex_nomenclature (set): Compartment(s) the exchange reactions are in
+        """
+        key = ('exchange', atom, frozenset(ex_nomenclature))
+        return self._cached_index(key, lambda model: ExchangeIndex.from_model(model, atom, ex_nomenclature))
+
+    def element_matrix(self, elements: tuple = ('C', 'N', 'P', 'S'), ex_nomenclature: set = {'e'}) -> ElementMatrix:
+        """Composition of the exchange reactions in several elements, computed once per model structure
+
+        Args:
+        elements (tuple): Elements of interest
+        ex_nomenclature (set): Compartment(s) the exchange reactions are in
+        """
+        key = ('elements', tuple(elements), frozenset(ex_nomenclature))
+        return self._cached_index(key, lambda model: ElementMatrix.from_model(model, elements, ex_nomenclature))
+
+    def stoichiometric_matrix(self) -> sparse.csc_matrix:
+        "Stoichiometric matrix (metabolites by reactions) of the model, computed once per model structure"
+        return self._cached_index(('stoichiometry',),
+                                  lambda model: create_stoichiometric_matrix(model, array_type='lil').tocsc())
+
+    def structure_hash(self) -> str:
+        "Hash of the model's reactions and stoichiometry, computed once per model structure"
+        return self._cached_index(('structure_hash',), structure_hash)
 
 
 class Experiment:
     "A collection of one strain in an environment"
 
-    def __init__(self, strain: Strain):
+    def __init__(self, strain: Strain, solution_cache: SolutionCache = None, compact: bool = False,
+                 ex_nomenclature: set = {'e'}):
         """
         organisms: A list of Organism(s)
+        solution_cache: Cache to look solutions up in before solving, and to
+            store new solutions in
+        compact: Keep an ExperimentResult in `result` instead of the full
+            cobra Solution in `solution`
+        ex_nomenclature: Compartment(s) of the exchange reactions whose fluxes
+            are kept in compact results
         solution
+        result
         cue
         """
         self.strain = strain
+        self.solution_cache = solution_cache
+        self.compact = compact
+        self.ex_nomenclature = ex_nomenclature
         self.solution = None
+        self.result = None
         self.cue = None
+        self.cue_range = None
+        self.use_efficiencies = None
+        self.cue_sensitivity = None
+
+    def _optimize(self, model: cobra.core.Model) -> cobra.Solution:
+        "Solve FBA, unless the same problem has been solved before"
+        if self.solution_cache is None:
+            with profiling.phase('experiment.solve', model):
+                return model.optimize()
+        # Hash the stoichiometry again, it may have been edited in place
+        with profiling.phase('solution_cache.get'):
+            key = self.solution_cache.key(model)
+            sol = self.solution_cache.get(key)
+        if sol is None:
+            profiling.count('solution_cache.miss')
+            with profiling.phase('experiment.solve', model):
+                sol = model.optimize()
+            with profiling.phase('solution_cache.set'):
+                self.solution_cache.set(key, sol)
+        else:
+            profiling.count('solution_cache.hit')
+        return sol
 
     def run(self):
         "Run FBA"
         # Warn if the experiment already has a solution
-        if self.solution is not None:
+        if self.solution is not None or self.result is not None:
             warnings.warn('There is already a solution saved to this experiment, running will overwrite those results')
 
-        # Solve FBA
-        sol = self.strain.model.optimize()
+        with profiling.phase('experiment.run'):
+            self._run()
+
+    def _run(self):
+        if not self.compact:
+            with self.strain.context() as model:
+                sol = self._optimize(model)
+
+            # Report the fluxes of the original reactions of a compressed model
+            if self.strain.compression is not None:
+                sol = cobra.Solution(sol.objective_value, sol.status, self.strain.compression.expand(sol.fluxes))
+
+            # Update the experiment object
+            self.solution = sol
+            return
+
+        # Only keep the carbon exchange fluxes
+        ex_index = self.strain.exchange_index(ex_nomenclature=self.ex_nomenclature)
+        with self.strain.context() as model:
+            if self.solution_cache is None:
+                # Skip building a Solution over every reaction
+                with profiling.phase('experiment.solve', model):
+                    value = model.slim_optimize()
+                status = model.solver.status
+                if np.isnan(value):
+                    fluxes = np.full(len(ex_index.reaction_ids), np.nan)
+                else:
+                    fluxes = net_fluxes([model.reactions.get_by_id(r) for r in ex_index.reaction_ids])
+            else:
+                sol = self._optimize(model)
+                value, status = sol.objective_value, sol.status
+                fluxes = sol.fluxes[ex_index.reaction_ids].to_numpy()
 
         # Update the experiment object
-        self.solution = sol
+        self.result = ExperimentResult(value, status, fluxes, ex_index.reaction_ids)
 
     def _atomExchangeMetabolite(self, atom = 'C', ex_nomenclature = {'e'}):
         # TODO: Infer the ex_nomenclature rather than forcing the user to provide it
@@ -76,8 +620,8 @@ class Experiment:
         # FIXME: This is where the issue is
         # compartment for CarveMe models is C_e
         # Compartment for BiGG models is e
-        ex_atoms = {r.id: m.elements[atom] for m in self.strain.model.metabolites for r in m.reactions if atom in m.elements if r.compartments == ex_nomenclature}
-        
+        ex_atoms = self.strain.exchange_index(atom, ex_nomenclature).as_dict()
+
         return ex_atoms
 
     def CUE(self, co2_rxn='EX_co2_e', ex_nomenclature = {'e'}, definition = 'rCUE'):
@@ -101,29 +645,282 @@ class Experiment:
             warnings.warn('There is already a cue value saved to this experiment, running will overwrite those results')
 
         # If the experiment does not have a solution, run it
-        if self.solution is None:
+        if self.solution is None and self.result is None:
             self.run()
 
-        # Get C atoms for each exchange reaction
-        ex_c_atoms = self._atomExchangeMetabolite(ex_nomenclature = ex_nomenclature)
+        # Time the exchange scan and CUE apart from the FBA run above
+        with profiling.phase('experiment.cue'):
+            # Get C atoms for each exchange reaction
+            ex_index = self.strain.exchange_index(ex_nomenclature=ex_nomenclature)
+            co2_index = ex_index.co2_position(co2_rxn, definition)
 
-        # Calculate CUE using one of the following definitions
-        if definition == 'rCUE':
-            # Subset to uptake reactions (negative flux)
-            uptake_rxns = self.solution.fluxes[ex_c_atoms.keys()].pipe(lambda x: x[x<0]).index
-            # Calculate uptake C flux
-            uptake = sum([self.solution.get_primal_by_id(r) * ex_c_atoms[r] for r in uptake_rxns if r != co2_rxn])
-            if uptake == 0:
-                cue = None
+            # Calculate both definitions from the exchange fluxes
+            if self.solution is not None:
+                fluxes = self.solution.fluxes[ex_index.reaction_ids].to_numpy()
+            elif self.result.reaction_ids == ex_index.reaction_ids:
+                fluxes = self.result.exchange_fluxes
             else:
-                # Calculate CUE
-                cue = 1 - abs(self.solution.get_primal_by_id(co2_rxn) / uptake)
-        else:
-            # Assume that the only other option is GGE
-            # Get C fluxes (flip signs so that uptake is positive)
-            c_ex_fluxes = np.array([self.solution.get_primal_by_id(r) * -c for r, c in ex_c_atoms.items()])
-            # Calculate GGE
-            cue = c_ex_fluxes.sum() / c_ex_fluxes[c_ex_fluxes > 0].sum()
+                raise ValueError('The compact results were kept for another exchange nomenclature, '
+                                 'make the Experiment with the same `ex_nomenclature`')
+            rcue, gge = cue_from_fluxes(fluxes, ex_index.atoms, co2_index)
+            if self.result is not None:
+                self.result.cue = None if np.isnan(rcue[0]) else float(rcue[0])
+                self.result.gge = float(gge[0])
+
+            # Keep the one that was asked for
+            if definition == 'rCUE':
+                # No carbon uptake gives no CUE
+                cue = None if np.isnan(rcue[0]) else rcue[0]
+            else:
+                # Assume that the only other option is GGE
+                cue = gge[0]
 
         # Update the experiment with the results
         self.cue = cue
+
+    def CUE_range(self, fraction_of_optimum: float = 1.0, co2_rxn: str = 'EX_co2_e',
+                  ex_nomenclature: set = {'e'}, definition: str = 'rCUE', workers: int = 1,
+                  tol: float = 1e-9, max_splits: int = 8) -> tuple:
+        """Range of CUE over the alternative optima with near-optimal growth
+
+        Flux variability is run only on the carbon exchange reactions (including
+        the CO2 exchange), with `workers` processes that each keep one solver
+        problem. Once each of those reactions can only take up or only secrete,
+        CUE is a ratio of two linear functions of the fluxes, and its exact
+        minimum and maximum are found by linear-fractional programming on a
+        single solver problem. Reactions that can go both ways (e.g. CO2 or
+        acetate in the medium) are split by direction: each combination of
+        directions is solved this way, and the range covers all of them. With
+        more than `max_splits` such reactions, the range is bounded from the
+        flux ranges instead, which contains the true one but may be much wider.
+
+        Args:
+        fraction_of_optimum (float): Fraction of the optimal growth that must be kept
+        co2_rxn (string): Name of the respiration reaction in the model
+        ex_nomenclature (string): Nomenclature the model uses to denote exchange
+            reactions (BiGG uses 'e', CarveMe uses 'C_e')
+        definition (string): What definition to use ('rCUE' or 'GGE')
+        workers (int): Number of processes for the flux variability
+        tol (float): Tolerance for the sign of a flux and for convergence
+        max_splits (int): Most reactions going both ways to split by direction,
+            there are 2 ** n combinations to solve for n of them
+
+        Returns:
+        cue_range (tuple): Minimum and maximum CUE
+        """
+        ex_index = self.strain.exchange_index(ex_nomenclature=ex_nomenclature)
+        atoms = dict(zip(ex_index.reaction_ids, ex_index.atoms))
+        if co2_rxn not in atoms:
+            raise KeyError(f'{co2_rxn} is not one of the carbon exchange reactions of the model')
+
+        # Relax the growth constraint slightly, so that it stays feasible at the optimum
+        fraction_of_optimum = fraction_of_optimum * (1 - tol)
+
+        with self.strain.context() as model:
+            # Targeted flux variability on the carbon exchanges only
+            fva = flux_variability_analysis(model, reaction_list=ex_index.reaction_ids,
+                                            fraction_of_optimum=fraction_of_optimum, processes=workers)
+            low, high = fva['minimum'].to_dict(), fva['maximum'].to_dict()
+            uptake_only = {r for r in atoms if high[r] <= tol}
+            secretion_only = {r for r in atoms if low[r] >= -tol}
+            both_ways = [r for r in atoms if r not in uptake_only | secretion_only]
+            # Carbon taken up, leaving out CO2 for rCUE
+            carbon = [r for r in atoms if r != co2_rxn] if definition == 'rCUE' else list(atoms)
+
+            if len(both_ways) <= max_splits:
+                fix_objective_as_constraint(model, fraction=fraction_of_optimum)
+                parts = []
+                for directions in product((-1, 1), repeat=len(both_ways)):
+                    with model:
+                        # Only let each reaction that goes both ways take up, or only secrete
+                        uptake = set(uptake_only)
+                        for r, direction in zip(both_ways, directions):
+                            rxn = model.reactions.get_by_id(r)
+                            if direction < 0:
+                                rxn.upper_bound = 0
+                                uptake.add(r)
+                            else:
+                                rxn.lower_bound = 0
+
+                        # Write CUE as 1 - num / den (rCUE) or num / den (GGE)
+                        if definition == 'rCUE':
+                            num = {co2_rxn: -1 if co2_rxn in uptake else 1}
+                        else:
+                            num = {r: -a for r, a in atoms.items()}
+                        den = {r: -atoms[r] for r in carbon if r in uptake}
+                        if not den or np.isnan(model.slim_optimize()):
+                            continue
+
+                        # Exact range of this part, starting from its optimal solution
+                        ids = list(set(num) | set(den))
+                        fluxes = dict(zip(ids, net_fluxes([model.reactions.get_by_id(r) for r in ids])))
+                        start = _linear_value(num, fluxes) / _linear_value(den, fluxes)
+                        parts.append(_fractional_range(model, num, den, start, tol=tol))
+                if parts:
+                    ratio_range = (min(p[0] for p in parts), max(p[1] for p in parts))
+                else:
+                    ratio_range = (np.nan, np.nan)
+            else:
+                # Outer bounds from the flux ranges
+                uptake = (sum(atoms[r] * max(0, -high[r]) for r in carbon),
+                          sum(atoms[r] * max(0, -low[r]) for r in carbon))
+                if definition == 'rCUE':
+                    co2_abs = sorted([abs(low[co2_rxn]), abs(high[co2_rxn])])
+                    if low[co2_rxn] < 0 < high[co2_rxn]:
+                        co2_abs[0] = 0
+                    numerator = tuple(co2_abs)
+                else:
+                    numerator = (sum(-a * high[r] for r, a in atoms.items()),
+                                 sum(-a * low[r] for r, a in atoms.items()))
+                if uptake[0] <= 0:
+                    ratio_range = (np.nan, np.nan) if uptake[1] <= 0 else (-np.inf, np.inf)
+                else:
+                    ratio_range = _interval_ratio(numerator, uptake)
+
+        # Neither definition can be above 1
+        if definition == 'rCUE':
+            cue_range = (1 - ratio_range[1], min(1 - ratio_range[0], 1))
+        else:
+            cue_range = (ratio_range[0], min(ratio_range[1], 1))
+
+        # Update the experiment with the results
+        self.cue_range = cue_range
+        return cue_range
+
+    def use_efficiency(self, elements: tuple = ('C', 'N', 'P', 'S'), co2_rxn: str = 'EX_co2_e',
+                       ex_nomenclature: set = {'e'}, definition: str = 'rCUE') -> dict:
+        """Calculate the use efficiency of several elements from one solution
+
+        Every element uses the Gross Growth Efficiency definition,
+
+                    sum(uptake X) - sum(secretion X)
+            XUE =  ----------------------------------
+                            sum(uptake X)
+
+        except carbon with the 'rCUE' definition (see `CUE`).
+
+        Args:
+        elements (tuple): Elements of interest
+        co2_rxn (string): Name of the respiration reaction in the model
+        ex_nomenclature (string): Nomenclature the model uses to denote exchange
+            reactions (BiGG uses 'e', CarveMe uses 'C_e')
+        definition (string): What definition to use for carbon
+
+        Returns:
+        use_efficiencies (dict): Efficiency of each element, keyed as 'CUE',
+            'NUE', 'PUE', 'SUE', etc., None where the element is not taken up
+        """
+        # If the experiment does not have a solution, run it
+        if self.solution is None and self.result is None:
+            self.run()
+        if self.solution is None:
+            raise ValueError('Use efficiencies need the full solution, make the Experiment with `compact=False`')
+
+        # Calculate all the elements at once from the exchange fluxes
+        element_matrix = self.strain.element_matrix(elements, ex_nomenclature)
+        fluxes = self.solution.fluxes[element_matrix.reaction_ids].to_numpy()
+        co2_index = element_matrix.position(co2_rxn) if definition == 'rCUE' else None
+        efficiency = use_efficiency_from_fluxes(fluxes, element_matrix, co2_index)[0]
+
+        # Update the experiment with the results
+        self.use_efficiencies = {f'{e}UE': None if np.isnan(x) else x for e, x in zip(element_matrix.elements, efficiency)}
+        return self.use_efficiencies
+
+    def CUE_sensitivity(self, co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'},
+                        definition: str = 'rCUE', step: float = 1e-3, tol: float = 1e-9) -> pd.Series:
+        """Derivative of CUE with respect to the uptake bound of each medium component
+
+        Components whose uptake is not at its bound do not limit the optimum,
+        and their sensitivity is 0. For the limiting ones, the change of the
+        fluxes is found from the optimal basis, by keeping every other reaction
+        at a bound where it is, from one sparse factorization. The direction is
+        used if the objective changes by the reduced cost from the shadow prices
+        (so the basis stays optimal) and it is unique. The remaining
+        components are re-solved after raising their bound by `step`, all on
+        the same solver problem.
+
+        Args:
+        co2_rxn (string): Name of the respiration reaction in the model
+        ex_nomenclature (string): Nomenclature the model uses to denote exchange
+            reactions (BiGG uses 'e', CarveMe uses 'C_e')
+        definition (string): What definition to use ('rCUE' or 'GGE')
+        step (float): Increase of the uptake bound (mmol/gDW/h) for the re-solves
+        tol (float): Tolerance for a flux being at its bound
+
+        Returns:
+        cue_sensitivity (pandas.Series): Change of CUE per unit increase of each
+            medium component's uptake bound, NaN if there is no CUE
+        """
+        ex_index = self.strain.exchange_index(ex_nomenclature=ex_nomenclature)
+        co2_index = ex_index.co2_position(co2_rxn, definition)
+        S = self.strain.stoichiometric_matrix()
+
+        with self.strain.context() as model:
+            medium = model.medium
+            sol = model.optimize()
+            if sol.status != 'optimal':
+                self.cue_sensitivity = pd.Series(np.nan, index=list(medium), name=self.strain.name)
+                return self.cue_sensitivity
+
+            # Fluxes, bounds and reduced costs (from the shadow prices) of every reaction
+            positions = {r.id: i for i, r in enumerate(model.reactions)}
+            fluxes = sol.fluxes.to_numpy()
+            lower = np.array([r.lower_bound for r in model.reactions])
+            upper = np.array([r.upper_bound for r in model.reactions])
+            # Read the objective once, `objective_coefficient` scans it for every reaction
+            objective = np.zeros(len(model.reactions))
+            for r, c in linear_reaction_coefficients(model).items():
+                objective[positions[r.id]] = c
+            prices = sol.shadow_prices[[m.id for m in model.metabolites]].to_numpy()
+            reduced = objective - S.T @ prices
+
+            # A reaction without flux is at a bound too: the solver splits reversible
+            # reactions in two, and both halves are then at their bound of 0
+            scale = tol * np.maximum(1.0, np.abs(fluxes))
+            at_bound = (np.abs(fluxes - lower) <= scale) | (np.abs(fluxes - upper) <= scale) | (np.abs(fluxes) <= scale)
+            free = np.flatnonzero(~at_bound)
+
+            # Medium components whose uptake is at its bound, and the change of
+            # their flux per unit of uptake ('met <=>' takes up with negative flux)
+            ids = list(medium)
+            rxns = [model.reactions.get_by_id(r) for r in ids]
+            columns = np.array([positions[r] for r in ids], dtype=int)
+            steps = np.array([-1.0 if r.reactants else 1.0 for r in rxns])
+            limiting = np.array([at_bound[k] and abs(fluxes[k] * d - medium[r]) <= scale[k]
+                                 for r, k, d in zip(ids, columns, steps)], dtype=bool)
+
+            # Analytic directions for the limiting components
+            carbon = np.array([positions[r] for r in ex_index.reaction_ids], dtype=int)
+            moved = np.flatnonzero(limiting)
+            directions, valid = _bound_directions(S, free, columns[moved], steps[moved], tol)
+            gain = directions @ objective
+            expected = reduced[columns[moved]] * steps[moved]
+            valid &= (np.abs(expected) > tol) & (np.abs(gain - expected) <= tol * max(1.0, sol.objective_value))
+
+            # Evaluate CUE a small way along each direction, all at once
+            h = tol ** 0.5
+            base = fluxes[carbon]
+            flux_rows = [base] + [base + h * d[carbon] for d in directions[valid]]
+
+            # Re-solve the rest on the same problem
+            resolved = moved[~valid]
+            for i in resolved:
+                with model:
+                    set_active_bound(rxns[i], medium[ids[i]] + step)
+                    if np.isnan(model.slim_optimize()):
+                        flux_rows.append(np.full(len(carbon), np.nan))
+                    else:
+                        flux_rows.append(net_fluxes([model.reactions[k] for k in carbon]))
+
+        rcue, gge = cue_from_fluxes(np.array(flux_rows), ex_index.atoms, co2_index)
+        cue = rcue if definition == 'rCUE' else gge
+
+        # Finite differences along the directions and over the re-solves
+        sensitivity = np.where(np.isnan(cue[0]), np.nan, 0.0) * np.ones(len(ids))
+        n_valid = int(valid.sum())
+        sensitivity[moved[valid]] = (cue[1:1 + n_valid] - cue[0]) / h
+        sensitivity[resolved] = (cue[1 + n_valid:] - cue[0]) / step
+
+        # Update the experiment with the results
+        self.cue_sensitivity = pd.Series(sensitivity, index=ids, name=self.strain.name)
+        return self.cue_sensitivity
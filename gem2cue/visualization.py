@@ -1,59 +1,200 @@
-import matplotlib as plt
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+from typing import List
+
+from cobra.util.solver import linear_reaction_coefficients
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.sankey import Sankey
+import numpy as np
+import pandas as pd
+
+from gem2cue.utils import Experiment
+
+# Columns of the table returned by `carbon_flows`
+FLOW_COLUMNS = ['strain', 'uptake', 'respiration', 'exudation', 'biomass']
+
+
+def _biomass_carbon(model, biomass_rxn: str = None) -> tuple:
+    """Carbon taken into biomass per unit flux of the biomass reaction
+
+    Args:
+    model (cobra.core.Model): Model with the biomass reaction
+    biomass_rxn (str): Name of the biomass reaction, defaults to the objective
+
+    Returns:
+    biomass_rxn (str): Name of the biomass reaction
+    carbon (float): Carbon atoms used minus carbon atoms made by the reaction
+    """
+    if biomass_rxn is None:
+        objective = list(linear_reaction_coefficients(model))
+        if len(objective) != 1:
+            raise ValueError('The objective is not a single reaction, give the name of the biomass reaction')
+        biomass_rxn = objective[0].id
+    metabolites = model.reactions.get_by_id(biomass_rxn).metabolites
+    return biomass_rxn, -sum(c * m.elements.get('C', 0) for m, c in metabolites.items())
+
+
+def carbon_flows(experiments: List[Experiment], co2_rxn: str = 'EX_co2_e', biomass_rxn: str = None,
+                 ex_nomenclature: set = {'e'}, definition: str = 'rCUE') -> pd.DataFrame:
+    """Split the carbon taken up by each Experiment into respiration, exudation and biomass
+
+    Experiments without a solution are run first. Experiments whose strains
+    share a model are computed together from one matrix of exchange fluxes,
+    and the carbon content of the biomass reaction is looked up once per model.
+
+    Args:
+    experiments (list): List of Experiment objects
+    co2_rxn (str): Name of the respiration reaction in the models
+    biomass_rxn (str): Name of the biomass reaction in the models, defaults to
+        the objective of each model
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    definition (str): CUE definition the flows are split for, rCUE needs
+        `co2_rxn` to be one of the carbon exchange reactions, with GGE a model
+        without it has no respiration
+
+    Returns:
+    flows (pandas.DataFrame): One row per experiment with the columns strain,
+        uptake, respiration, exudation and biomass, all in C-mmol/gDW/h
+    """
+    flows = np.full((len(experiments), 4), np.nan)
+
+    # Group the experiments by model, so each group shares its exchange reactions
+    groups = {}
+    for i, experiment in enumerate(experiments):
+        if experiment.solution is None and experiment.result is None:
+            experiment.run()
+        groups.setdefault(id(experiment.strain.model), []).append(i)
+
+    for rows in groups.values():
+        strain = experiments[rows[0]].strain
+        ex_index = strain.exchange_index(ex_nomenclature=ex_nomenclature)
+        co2_index = ex_index.co2_position(co2_rxn, definition)
+        rxn, carbon = _biomass_carbon(strain.model, biomass_rxn)
+        # Compact results only have the growth of the objective
+        objective = [r.id for r in linear_reaction_coefficients(strain.model)] == [rxn]
+
+        # Exchange and biomass fluxes of every experiment in the group
+        fluxes = np.empty((len(rows), len(ex_index.reaction_ids)))
+        growth = np.empty(len(rows))
+        for k, i in enumerate(rows):
+            experiment = experiments[i]
+            if experiment.solution is not None:
+                fluxes[k] = experiment.solution.fluxes[ex_index.reaction_ids].to_numpy()
+                growth[k] = experiment.solution.fluxes[rxn]
+            elif objective and experiment.result.reaction_ids == ex_index.reaction_ids:
+                fluxes[k] = experiment.result.exchange_fluxes
+                growth[k] = experiment.result.objective_value
+            else:
+                raise ValueError('Carbon flows need the full solution, make the Experiment with `compact=False`')
+
+        # Carbon through each exchange, leaving CO2 out of uptake and exudation
+        carbon_fluxes = fluxes * ex_index.atoms
+        if co2_index is None:
+            respiration = 0
+        else:
+            respiration = carbon_fluxes[:, co2_index].copy()
+            carbon_fluxes[:, co2_index] = 0
+        flows[rows, 0] = -np.minimum(carbon_fluxes, 0).sum(axis=1)
+        flows[rows, 1] = respiration
+        flows[rows, 2] = np.maximum(carbon_fluxes, 0).sum(axis=1)
+        flows[rows, 3] = growth * carbon
+
+    table = pd.DataFrame(flows, columns=FLOW_COLUMNS[1:])
+    table.insert(0, 'strain', [e.strain.name for e in experiments])
+    return table
+
+
+def _draw_sankey(ax, name: str, uptake: float, respiration: float, exudation: float, biomass: float):
+    "Draw the carbon flow of one strain on an axes, normalized to uptake, replacing what was drawn before"
+    for artist in list(ax.patches) + list(ax.texts):
+        artist.remove()
+    Sankey(ax=ax,
+           flows=[1, -respiration / uptake, -exudation / uptake, -biomass / uptake],
+           labels=['U = A', 'R', 'EX', 'G'],
+           orientations=[0, 1, 1, 0],
+           pathlengths=[1, 0.25, 0.25, 0.5],
+           # The same color on a reused axes
+           facecolor='C0').finish()
+    # Keep the limits set by the diagram, and fit the box to them
+    ax.set_adjustable('box')
+    ax.set_title('Carbon Flow for ' + name)
+
+
+def _new_figure() -> tuple:
+    "Figure drawn without a display, with one axes for Sankey diagrams"
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1, xticks=[], yticks=[])
+    return fig, ax
+
+
+def _render_chunk(rows: List[tuple], out_dir: str, file_format: str, dpi: int) -> List[str]:
+    "Draw and save the diagrams of a list of rows, reusing one figure"
+    fig, ax = _new_figure()
+    paths = []
+    for file_name, name, *flows in rows:
+        _draw_sankey(ax, name, *flows)
+        path = os.path.join(out_dir, f'{file_name}.{file_format}')
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+    return paths
+
+
+def render_sankeys(flows: pd.DataFrame, out_dir: str, workers: int = 1, file_format: str = 'png',
+                   dpi: int = 100) -> List[str]:
+    """Save a Sankey diagram of the carbon flow of each row of `carbon_flows`
+
+    Diagrams are drawn without a display (with the Agg canvas), one figure is
+    reused by each worker process, and the rows are split over `workers`
+    processes. Files are named after the strain, with the row number added to
+    names that repeat. Rows without carbon uptake are skipped.
+
+    Args:
+    flows (pandas.DataFrame): Table returned by `carbon_flows`
+    out_dir (str): Directory to write the diagrams to, made if needed
+    workers (int): Number of worker processes, 1 draws everything in this process
+    file_format (str): Image format to save, e.g. 'png' or 'svg'
+    dpi (int): Resolution of raster images
+
+    Returns:
+    paths (list): Paths of the files written, in the order of the rows
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Only ship the numbers to the workers
+    repeated = flows['strain'].duplicated(keep=False)
+    rows = [(f'{name}_{i}' if repeated.iloc[i] else name, name, *values)
+            for i, (name, *values) in enumerate(flows[FLOW_COLUMNS].itertuples(index=False))
+            if values[0] > 0]
+
+    if workers is None or workers <= 1:
+        return _render_chunk(rows, out_dir, file_format, dpi)
+
+    # A few chunks per worker, to even out the load
+    size = max(1, -(-len(rows) // (4 * workers)))
+    chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_render_chunk, chunks, repeat(out_dir), repeat(file_format), repeat(dpi))
+        return [path for paths in results for path in paths]
+
 
 def sankey(self, co2_rxn: str ='EX_co2_e', biomass_rxn: str = 'BIOMASS_Ecoli_core_w_GAM'):
-        """ Create and save a sankey diagram for the CUE of a specific model
-    
+        """ Create a sankey diagram for the CUE of a specific model
+
         Args:
-        model (cobra.core.Model): Model to be solved
-        co2_rxn (str): Name of the respiration reaction in the model (defaults to 
+        self (Experiment): Experiment with the model/media to use
+        co2_rxn (str): Name of the respiration reaction in the model (defaults to
             'EX_co2_e')
         biomass_rxn (str): Name of the biomass reaction in the model (defaults to
             'BIOMASS_Ecoli_core_w_GAM')
-        
+
         Returns:
-        plt object
+        matplotlib.figure.Figure object
         """
-        # If the experiment does not have a solution, run it
-        if self.solution is None:
-            self.run()
-
-        # Look up the exchange reactions
-        ex_c_atoms = self._atomExchangeMetabolite()
-
-        # Find the uptake flux
-        uptake_rxns = self.solution.fluxes[ex_c_atoms.keys()].pipe(lambda x: x[x<0]).index # Negative flux for uptake
-        uptake = abs(sum([self.solution.get_primal_by_id(r) * ex_c_atoms[r] for r in uptake_rxns if r != co2_rxn])) # Doesn't really matter if we say no CO2 rxn or not, it shouldn't be a negative flux
-
-        # Find the respiration flux
-        resp = -1 * self.solution.get_primal_by_id(co2_rxn) # Don't multiply because we know that the number of c atoms is 1 for CO2
-
-        # Find the exudation flux
-        exudation_rxns = self.solution.fluxes[ex_c_atoms.keys()].pipe(lambda x: x[x>0]).index # Postive flux for exudation
-        ex = -1 * abs(sum([self.solution.get_primal_by_id(r) * ex_c_atoms[r] for r in exudation_rxns if r != co2_rxn])) # Do really need to say no CO2 reaction
-
-        # Find the biomass flux
-        # Make a dictionary of the fluxes for each metabolite in the biomass reaction
-        biomass_dict = getattr(self.strain.model.reactions, biomass_rxn).metabolites
-        # Find the number of C atoms that the biomass reaction takes in
-        biom_in = abs(sum([biomass_dict[m] * self.solution.get_primal_by_id(biomass_rxn) * m.elements['C'] for m in biomass_dict if biomass_dict[m] < 0 if 'C' in m.elements]))
-        # Find the number of C atoms that the biomass reaction puts out
-        biom_out = abs(sum([biomass_dict[m] * self.solution.get_primal_by_id(biomass_rxn) * m.elements['C'] for m in biomass_dict if biomass_dict[m] > 0 if 'C' in m.elements]))
-        # Find the difference
-        # Is this what actually goes to biomass?
-        biom = -1 * (biom_in - biom_out)
-
-        # Normalize to uptake
-        uptake_norm = 1
-        resp_norm = resp / uptake
-        ex_norm = ex / uptake
-        biom_norm = biom / uptake
-
-        # Make the plot
-        fig = plt.figure()
-        Sankey(flows = [uptake_norm, resp_norm, ex_norm, biom_norm],
-            labels = ['U = A', 'R', 'EX', 'G'],
-            orientations = [0, 1, 1, 0],
-            pathlengths = [1, 0.25, 0.25, 0.5]).finish()
-        plt.title('Carbon Flow for ' + self.strain.name)
-        return(fig)
\ No newline at end of file
+        # Split up the carbon flow, then draw it
+        flows = carbon_flows([self], co2_rxn=co2_rxn, biomass_rxn=biomass_rxn)
+        fig, ax = _new_figure()
+        _draw_sankey(ax, *flows[FLOW_COLUMNS].iloc[0])
+        return(fig)
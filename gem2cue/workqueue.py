@@ -0,0 +1,284 @@
+"Running CUE campaigns from a queue of tasks shared by workers on any number of machines"
+
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import List, Union
+
+import pandas as pd
+
+from gem2cue.batch import _run_one, _strain_name, list_model_files
+from gem2cue.cache import ModelCache, load_model
+from gem2cue.utils import Media, Strain
+
+# Columns of the table returned by `WorkQueue.results`
+TASK_COLUMNS = ['task', 'model', 'strain', 'medium', 'definition', 'state', 'attempts', 'worker',
+                'status', 'growth', 'cue', 'error']
+
+# A task handed to a worker by `WorkQueue.claim`, `bounds` is None for the model's own medium
+Task = namedtuple('Task', ['task', 'model', 'strain', 'medium', 'bounds', 'definition', 'attempts'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    strain TEXT NOT NULL,
+    medium TEXT NOT NULL,
+    bounds TEXT,
+    definition TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    status TEXT,
+    growth REAL,
+    cue REAL,
+    error TEXT,
+    UNIQUE (model, medium, definition)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires);
+"""
+
+
+class WorkQueue:
+    """
+    Queue of (model file, medium, definition) tasks kept in an SQLite database
+
+    A coordinator adds tasks with `enqueue`, and any number of workers (see
+    `run_worker`) claim them, run them and write their results back to the
+    same database. A claimed task is leased to its worker for `lease` seconds;
+    if the worker dies and the lease runs out, the task goes back to whoever
+    claims next, at most `max_retries` times before it is marked failed. Tasks
+    that raise an error are marked failed straight away, as in `run_batch`.
+
+    To spread workers over several machines, put the database and the model
+    files on a filesystem they all mount at the same path. SQLite needs working
+    file locks there (most NFS setups have them), and the machines' clocks
+    should agree to well within the lease.
+
+    Inputs:
+    | path <str>: Database file, made if it does not exist
+    | lease <float>: Seconds a worker has to finish a task it claimed
+    | max_retries <int>: Times a task whose lease ran out is handed out again
+    """
+    def __init__(self, path: str, lease: float = 600.0, max_retries: int = 1):
+        self.path = path
+        self.lease = lease
+        self.max_retries = max_retries
+        # Transactions are started by hand, see `_transaction`
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        "Hold the write lock of the database, so no two workers claim the same task"
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def enqueue(self, models: Union[str, List[str]], media: Union[dict, list] = None,
+                definition: str = 'rCUE') -> int:
+        """Add a task for every model file in every medium
+
+        Tasks already in the queue are not added again, so a campaign can be
+        enqueued more than once, e.g. after more models were added to a directory.
+
+        Args:
+        models (str or list): Directory of SBML files, an SBML file, or a list of them
+        media (dict or list): Media objects, either as a dictionary with the names
+            of the media as keys or as a list. Defaults to each model's own medium
+        definition (str): CUE definition passed to `Experiment.CUE` ('rCUE' or 'GGE')
+
+        Returns:
+        added (int): Number of tasks added
+        """
+        if isinstance(models, (str, os.PathLike)):
+            models = list_model_files(models) if os.path.isdir(models) else [models]
+        if media is None:
+            media = {'': None}
+        elif not isinstance(media, dict):
+            media = {m.name if m.name is not None else str(i): m for i, m in enumerate(media)}
+
+        # Absolute paths, so that workers started anywhere find the files
+        rows = [(os.path.abspath(path), _strain_name(path), str(name),
+                 None if medium is None else json.dumps(medium.media), definition)
+                for path in models for name, medium in media.items()]
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO tasks (model, strain, medium, bounds, definition) '
+                           'VALUES (?, ?, ?, ?, ?)', rows)
+            return db.total_changes - before
+
+    def claim(self, worker: str, n: int = 1) -> List[Task]:
+        """Lease up to n tasks to a worker
+
+        Tasks are handed out in the order they were added, so the tasks of one
+        model tend to go to the same worker. Tasks whose lease ran out are
+        handed out again, or marked failed if they have run out of retries.
+
+        Args:
+        worker (str): Name of the worker
+        n (int): Most tasks to claim
+
+        Returns:
+        tasks (list): Tasks claimed, empty if there are none to claim
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE tasks SET state = 'failed', worker = NULL, lease_expires = NULL, "
+                       "error = 'Lease expired ' || attempts || ' times' "
+                       "WHERE state = 'running' AND lease_expires < ? AND attempts > ?",
+                       (now, self.max_retries))
+            rows = db.execute("SELECT task, model, strain, medium, bounds, definition, attempts FROM tasks "
+                              "WHERE state = 'pending' OR (state = 'running' AND lease_expires < ?) "
+                              "ORDER BY task LIMIT ?", (now, n)).fetchall()
+            db.executemany("UPDATE tasks SET state = 'running', worker = ?, lease_expires = ?, "
+                           "attempts = attempts + 1 WHERE task = ?",
+                           [(worker, now + self.lease, r[0]) for r in rows])
+
+        return [Task(task, model, strain, medium, None if bounds is None else json.loads(bounds),
+                     definition, attempts + 1)
+                for task, model, strain, medium, bounds, definition, attempts in rows]
+
+    def renew(self, tasks: List[int], worker: str):
+        "Extend the lease of tasks the worker still holds by another `lease` seconds"
+        with self._transaction() as db:
+            db.executemany("UPDATE tasks SET lease_expires = ? WHERE task = ? AND worker = ? AND state = 'running'",
+                           [(time.time() + self.lease, t, worker) for t in tasks])
+
+    def complete(self, task: int, worker: str, row: dict) -> bool:
+        """Write the result of a task back
+
+        Args:
+        task (int): ID of the task
+        worker (str): Name of the worker that ran it
+        row (dict): Row of the results table (see `gem2cue.batch.RESULT_COLUMNS`),
+            a task whose status is 'error' is marked failed
+
+        Returns:
+        kept (bool): False if the task had been handed to another worker since,
+            in which case its result is the other worker's
+        """
+        state = 'failed' if row['status'] == 'error' else 'done'
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE tasks SET state = ?, lease_expires = NULL, status = ?, growth = ?, "
+                                "cue = ?, error = ? WHERE task = ? AND worker = ? AND state = 'running'",
+                                (state, row['status'], row['growth'], row['cue'], row['error'], task, worker))
+            return cursor.rowcount == 1
+
+    def progress(self) -> dict:
+        """How far the campaign has got
+
+        Returns:
+        progress (dict): Number of tasks that are pending, running, done and
+            failed, of running tasks whose lease ran out ('expired'), of
+            workers holding a lease and of tasks in total
+        """
+        now = time.time()
+        counts = dict.fromkeys(['pending', 'running', 'done', 'failed'], 0)
+        counts.update(self.db.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+        counts['expired'], counts['workers'] = self.db.execute(
+            "SELECT SUM(lease_expires < ?), COUNT(DISTINCT CASE WHEN lease_expires >= ? THEN worker END) "
+            "FROM tasks WHERE state = 'running'", (now, now)).fetchone()
+        counts['expired'] = counts['expired'] or 0
+        counts['total'] = sum(counts[s] for s in ['pending', 'running', 'done', 'failed'])
+        return counts
+
+    def finished(self) -> bool:
+        "Whether every task is done or failed"
+        return self.db.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'running')").fetchone()[0] == 0
+
+    def results(self) -> pd.DataFrame:
+        """Every task, with its result if it has one
+
+        Returns:
+        results (pandas.DataFrame): One row per task, in the order they were
+            added, with the columns task, model, strain, medium, definition,
+            state, attempts, worker, status, growth, cue and error
+        """
+        rows = self.db.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks ORDER BY task").fetchall()
+        return pd.DataFrame(rows, columns=TASK_COLUMNS)
+
+    def close(self):
+        self.db.close()
+
+
+def run_worker(path: str, worker: str = None, batch_size: int = 1, lease: float = 600.0,
+               max_retries: int = 1, wait: bool = False, poll: float = 10.0, max_tasks: int = None,
+               co2_rxn: str = 'EX_co2_e', ex_nomenclature: set = {'e'}, cache: ModelCache = None) -> int:
+    """Claim tasks from a WorkQueue and run them until there are none left
+
+    Start as many workers as wanted, on any machine that can reach the queue.
+    Consecutive tasks on the same model file reuse the model read for the
+    first one. The leases of claimed tasks are renewed before each task, so a
+    lease only needs to cover the longest single task.
+
+    Args:
+    path (str): Database file of the WorkQueue
+    worker (str): Name of the worker, defaults to the host name and process ID
+    batch_size (int): Number of tasks claimed at a time
+    lease (float): Seconds the worker has to finish each task
+    max_retries (int): Times a task whose lease ran out is handed out again
+    wait (bool): Keep polling while other workers still hold tasks, in case
+        their leases run out, rather than stopping when nothing can be claimed
+    poll (float): Seconds between polls when waiting
+    max_tasks (int): Stop after this many tasks
+    co2_rxn (str): Name of the respiration reaction in the models
+    ex_nomenclature (set): Compartment(s) used for exchange reactions
+    cache (ModelCache): Model cache, defaults to `gem2cue.cache.get_default_cache()`
+
+    Returns:
+    n_tasks (int): Number of tasks run by this worker
+    """
+    queue = WorkQueue(path, lease=lease, max_retries=max_retries)
+    if worker is None:
+        worker = f'{socket.gethostname()}-{os.getpid()}'
+    model_path, model, load_error = None, None, None
+    n_tasks = 0
+    try:
+        while max_tasks is None or n_tasks < max_tasks:
+            n = batch_size if max_tasks is None else min(batch_size, max_tasks - n_tasks)
+            tasks = queue.claim(worker, n)
+            if not tasks:
+                if wait and not queue.finished():
+                    time.sleep(poll)
+                    continue
+                break
+
+            for k, task in enumerate(tasks):
+                if k > 0:
+                    queue.renew([t.task for t in tasks[k:]], worker)
+
+                # Read the model once for a run of tasks on the same file
+                if task.model != model_path:
+                    model_path = task.model
+                    try:
+                        model, load_error = load_model(model_path, cache), None
+                    except Exception as e:
+                        model, load_error = None, f'{type(e).__name__}: {e}'
+
+                if model is None:
+                    row = {'strain': task.strain, 'status': 'error', 'growth': None, 'cue': None,
+                           'error': load_error}
+                else:
+                    # The strain shares the model, so the medium is undone after each task
+                    strain = Strain(task.strain, model, copy=False)
+                    if task.bounds is not None:
+                        strain.update_medium(Media(task.bounds, task.medium))
+                    cue_kwargs = {'co2_rxn': co2_rxn, 'ex_nomenclature': ex_nomenclature,
+                                  'definition': task.definition}
+                    row, _ = _run_one(strain, cue_kwargs)
+                queue.complete(task.task, worker, row)
+                n_tasks += 1
+    finally:
+        queue.close()
+
+    return n_tasks
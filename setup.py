@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='GEM2CUE',
@@ -6,4 +6,7 @@ setup(
     packages=['gem2cue',],
     license='MIT License',
     long_description=open('README.md').read(),
-)
\ No newline at end of file
+    entry_points={
+        'console_scripts': ['gem2cue=gem2cue.cli:main'],
+    },
+)
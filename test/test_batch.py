@@ -0,0 +1,111 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cobra
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.batch
+import gem2cue.cache
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class CrashingStrain(gem2cue.utils.Strain):
+    "Strain that takes the process solving it down"
+    def context(self):
+        os._exit(1)
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+
+    def test_run_batch(self):
+        "Test running a batch of strains, including an infeasible one"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        # Make a strain that cannot grow: no carbon source, but ATP maintenance
+        starved = gem2cue.utils.Strain("starved", self.model)
+        starved.update_medium(gem2cue.utils.Media({'EX_h_e': 1000.0, 'EX_h2o_e': 1000.0}))
+
+        for workers in [1, 2]:
+            results = gem2cue.batch.run_batch([ecoli, starved, ecoli], workers=workers)
+
+            # Check the table has one row per strain, in order
+            self.assertEqual(list(results['strain']), ['ecoli', 'starved', 'ecoli'])
+            # Check the values for the good strain
+            self.assertEqual(results['status'][0], 'optimal')
+            self.assertAlmostEqual(results['cue'][0], 0.6198361114965837)
+            self.assertAlmostEqual(results['cue'][2], 0.6198361114965837)
+            # Check the infeasible strain did not stop the batch
+            self.assertEqual(results['status'][1], 'infeasible')
+            self.assertTrue(results['cue'].isna()[1])
+
+    def test_run_batch_crash(self):
+        "Test that only the strain crashing its worker is recorded as crashed"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        crashing = CrashingStrain("crashing", self.model)
+        strains = [ecoli] * 3 + [crashing] + [ecoli] * 6
+        results = gem2cue.batch.run_batch(strains, workers=2)
+
+        self.assertEqual(list(results['strain']), ['ecoli'] * 3 + ['crashing'] + ['ecoli'] * 6)
+        self.assertEqual(results['error'][3], 'Worker process crashed')
+        good = results.drop(index=3)
+        self.assertTrue((good['status'] == 'optimal').all())
+        self.assertTrue(all(abs(c - 0.6198361114965837) < 1e-7 for c in good['cue']))
+
+    def test_run_batch_gge(self):
+        "Test passing the CUE definition through"
+        # With little oxygen E. coli secretes carbon, so GGE is below rCUE
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        ecoli.update_medium(gem2cue.utils.Media({'EX_glc__D_e': 10, 'EX_o2_e': 2, 'EX_nh4_e': 1000,
+                                                 'EX_pi_e': 1000, 'EX_h2o_e': 1000, 'EX_h_e': 1000}))
+        expected = {}
+        for definition in ['rCUE', 'GGE']:
+            experiment = gem2cue.utils.Experiment(ecoli)
+            experiment.CUE(definition=definition)
+            expected[definition] = experiment.cue
+        self.assertGreater(expected['rCUE'] - expected['GGE'], 0.1)
+
+        for definition in ['rCUE', 'GGE']:
+            results = gem2cue.batch.run_batch([ecoli], definition=definition)
+            self.assertAlmostEqual(results['cue'][0], expected[definition])
+
+
+class TestRunFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = gem2cue.cache.ModelCache(os.path.join(self.tmp_dir, 'cache'))
+
+    def test_run_files(self):
+        "Test loading and solving a directory of model files"
+        # Copy the test models, and add a file that is not a model
+        model_dir = os.path.join(self.tmp_dir, 'models')
+        shutil.copytree(os.path.join(TEST_DIR, 'test_files'), model_dir)
+        with open(os.path.join(model_dir, 'broken.xml'), 'w') as f:
+            f.write('not a model')
+        self.assertEqual([os.path.basename(f) for f in gem2cue.batch.list_model_files(model_dir)],
+                         ['EC_core_flux1.xml', 'broken.xml', 'iIT341.xml'])
+
+        # Compare with loading the models and running them as a batch
+        models = [cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', f))
+                  for f in ['EC_core_flux1.xml', 'iIT341.xml']]
+        expected = gem2cue.batch.run_batch([gem2cue.utils.Strain('a', m) for m in models])
+
+        for workers in [1, 2]:
+            results = gem2cue.batch.run_files(model_dir, workers=workers, prefetch=1,
+                                              cache=self.cache)
+            self.assertEqual(list(results['strain']), ['EC_core_flux1', 'broken', 'iIT341'])
+            self.assertEqual(list(results['status']), ['optimal', 'error', 'optimal'])
+            self.assertAlmostEqual(results['cue'][0], expected['cue'][0])
+            self.assertAlmostEqual(results['cue'][2], expected['cue'][1])
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
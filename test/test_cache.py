@@ -0,0 +1,140 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cobra
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.cache
+import gem2cue.utils
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+MODEL_FILE = os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml')
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = gem2cue.cache.ModelCache(self.cache_dir)
+
+    def test_load(self):
+        "Test reading a model through the cache"
+        # The first read parses the file and stores it
+        model_1 = self.cache.load(MODEL_FILE)
+        self.assertEqual(len(self.cache.cache), 1)
+
+        # The second read comes from the cache, as a new object
+        model_2 = self.cache.load(MODEL_FILE)
+        self.assertEqual(len(self.cache.cache), 1)
+        self.assertIsNot(model_1, model_2)
+        self.assertEqual(len(model_1.reactions), len(model_2.reactions))
+        self.assertAlmostEqual(model_2.slim_optimize(), 0.8739215069684279)
+
+        # A copy of the file with another name hits the same entry
+        copy_file = os.path.join(self.cache_dir, 'copy.xml')
+        shutil.copy(MODEL_FILE, copy_file)
+        self.assertEqual(self.cache.key(copy_file), self.cache.key(MODEL_FILE))
+
+    def test_solver(self):
+        "Test that models read under another solver are not reused"
+        try:
+            cobra_config.solver = "glpk"
+            glpk_model = self.cache.load(MODEL_FILE)
+        finally:
+            cobra_config.solver = "glpk_exact"
+        model = self.cache.load(MODEL_FILE)
+        self.assertEqual(glpk_model.solver.interface.__name__, 'optlang.glpk_interface')
+        self.assertEqual(model.solver.interface.__name__, 'optlang.glpk_exact_interface')
+        self.assertEqual(len(self.cache.cache), 2)
+
+    def test_strain_from_file(self):
+        "Test making a Strain from a file path"
+        with gem2cue.cache.default_cache(self.cache):
+            strain = gem2cue.utils.Strain('ecoli', MODEL_FILE)
+            strain_2 = gem2cue.utils.Strain('ecoli', MODEL_FILE)
+
+        # Both strains have their own model, read once
+        self.assertEqual(len(self.cache.cache), 1)
+        self.assertIsNot(strain.model, strain_2.model)
+        self.assertFalse(strain.shared)
+        self.assertEqual(len(strain.model.medium), 7)
+
+    def test_default_cache(self):
+        "Test changing the default cache and going back to it"
+        with gem2cue.cache.default_cache(self.cache):
+            with gem2cue.cache.default_cache(None):
+                self.assertIsNone(gem2cue.cache.get_default_cache())
+            self.assertIs(gem2cue.cache.get_default_cache(), self.cache)
+
+        # Caching is turned back on, with the cache in the user's directory made on first use
+        with gem2cue.cache.default_cache(None):
+            gem2cue.cache.reset_default_cache()
+            self.assertTrue(gem2cue.cache._default_cache_enabled)
+            self.assertIsNone(gem2cue.cache._default_cache)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cache_dir)
+
+
+class TestSolutionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = gem2cue.cache.SolutionCache(self.cache_dir)
+
+    def test_experiment_cache(self):
+        "Test reusing solutions across Experiments"
+        model = cobra.io.read_sbml_model(MODEL_FILE)
+        strain = gem2cue.utils.Strain('ecoli', model, copy=False)
+
+        # The first run solves and stores the solution
+        experiment = gem2cue.utils.Experiment(strain, solution_cache=self.cache)
+        experiment.CUE()
+        self.assertEqual(len(self.cache.cache), 1)
+
+        # The second run comes from the cache, with the same results
+        cached = gem2cue.utils.Experiment(strain, solution_cache=self.cache)
+        cached.CUE()
+        self.assertEqual(len(self.cache.cache), 1)
+        self.assertIsNone(cached.solution.reduced_costs)
+        self.assertAlmostEqual(cached.solution.objective_value, experiment.solution.objective_value)
+        self.assertAlmostEqual(cached.cue, experiment.cue)
+
+        # A different medium is a different problem
+        strain.update_medium(gem2cue.utils.Media({'EX_co2_e': 1000.0, 'EX_ac_e': 10.0, 'EX_h_e': 1000.0,
+                                                  'EX_h2o_e': 1000.0, 'EX_nh4_e': 1000.0, 'EX_o2_e': 1000.0,
+                                                  'EX_pi_e': 1000.0}))
+        acetate = gem2cue.utils.Experiment(strain, solution_cache=self.cache)
+        acetate.run()
+        self.assertEqual(len(self.cache.cache), 2)
+        self.assertLess(acetate.solution.objective_value, experiment.solution.objective_value)
+
+        # So is a stoichiometry edited in place
+        with model:
+            model.reactions.PGI.add_metabolites({model.metabolites.h2o_c: -1})
+            edited = gem2cue.utils.Experiment(strain, solution_cache=self.cache)
+            edited.run()
+        self.assertEqual(len(self.cache.cache), 3)
+
+        # So is a different objective
+        with model:
+            model.objective = 'ATPM'
+            key = self.cache.key(model)
+        self.assertNotIn(key, self.cache.cache)
+
+        # Invalidate one entry, then all of them
+        with strain.context() as m:
+            key = self.cache.key(m)
+        self.cache.invalidate(key)
+        self.assertEqual(len(self.cache.cache), 2)
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache.cache), 0)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
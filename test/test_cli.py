@@ -0,0 +1,60 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import cobra
+import pandas as pd
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue
+import gem2cue.cache
+import gem2cue.cli
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+MODEL_FILE = os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml')
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+
+    def test_lazy_imports(self):
+        "Test that the package and the help of the command line do not import cobra"
+        code = ('import sys, gem2cue.cli\n'
+                'try:\n'
+                '    gem2cue.cli.main(["--help"])\n'
+                'except SystemExit:\n'
+                '    pass\n'
+                'print(sorted(m for m in ("cobra", "pandas", "matplotlib") if m in sys.modules))')
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             cwd=os.path.dirname(TEST_DIR), check=True).stdout
+        self.assertEqual(out.splitlines()[-1], '[]')
+
+        # Names are imported from their submodules on first use
+        self.assertIs(gem2cue.Experiment, gem2cue.utils.Experiment)
+        with self.assertRaises(AttributeError):
+            gem2cue.not_a_name
+
+    def test_cue(self):
+        "Test calculating CUE for a model file"
+        output = os.path.join(self.out_dir, 'cue.csv')
+        # The command turns the cache off for the rest of the process, undo it after
+        with gem2cue.cache.default_cache(None):
+            status = gem2cue.cli.main(['cue', MODEL_FILE, '--no-cache', '-o', output])
+        self.assertEqual(status, 0)
+        table = pd.read_csv(output)
+        self.assertEqual(list(table['strain']), ['EC_core_flux1'])
+        self.assertAlmostEqual(table['cue'][0], 0.6198361114965837)
+
+        # A path that does not exist
+        self.assertEqual(gem2cue.cli.main(['cue', os.path.join(self.out_dir, 'missing.xml')]), 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
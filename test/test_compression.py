@@ -0,0 +1,79 @@
+import unittest
+import os
+import cobra
+from cobra.util.array import create_stoichiometric_matrix
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.compression
+import gem2cue.knockouts
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'iIT341.xml'))
+
+    def test_compress_model(self):
+        "Test that the compressed model has the same optimum, in any medium"
+        compressed = self.model.copy()
+        compression = gem2cue.compression.compress_model(compressed)
+
+        # The model is smaller, but keeps its exchanges and biomass
+        self.assertLess(len(compressed.reactions), len(self.model.reactions) * 0.7)
+        self.assertEqual({r.id for r in compressed.boundary}, {r.id for r in self.model.boundary})
+        self.assertIn('BIOMASS_HP_published', compressed.reactions)
+        self.assertEqual(compression.reaction_ids, [r.id for r in self.model.reactions])
+
+        S = create_stoichiometric_matrix(self.model)
+        for medium in [self.model.medium, {**self.model.medium, 'EX_o2_e': 0.0, 'EX_ac_e': 10.0}]:
+            with self.model, compressed:
+                self.model.medium = medium
+                compressed.medium = medium
+                expected = self.model.optimize()
+                solution = compressed.optimize()
+                self.assertAlmostEqual(solution.objective_value, expected.objective_value)
+
+                # The original fluxes are balanced and within their bounds
+                fluxes = compression.expand(solution.fluxes)
+                self.assertEqual(list(fluxes.index), compression.reaction_ids)
+                self.assertLess(np.abs(S @ fluxes.to_numpy()).max(), 1e-6)
+                for r in self.model.reactions:
+                    self.assertGreaterEqual(fluxes[r.id], r.lower_bound - 1e-6)
+                    self.assertLessEqual(fluxes[r.id], r.upper_bound + 1e-6)
+
+    def test_compressed_strain(self):
+        "Test running Experiments and knockouts on a compressed strain"
+        strain = gem2cue.utils.Strain("hp", self.model, copy=False)
+        compressed = gem2cue.utils.Strain("hp", self.model, copy=False)
+        compressed.compress()
+
+        # The shared model was copied before being compressed
+        self.assertEqual(len(self.model.reactions), len(compressed.compression.reaction_ids))
+        with self.assertRaises(ValueError):
+            compressed.compress()
+
+        # Fluxes are given for the original reactions
+        experiment = gem2cue.utils.Experiment(strain)
+        experiment.CUE()
+        compressed_experiment = gem2cue.utils.Experiment(compressed)
+        compressed_experiment.CUE()
+        self.assertEqual(list(compressed_experiment.solution.fluxes.index), [r.id for r in self.model.reactions])
+        self.assertAlmostEqual(compressed_experiment.cue, experiment.cue)
+
+        # Knockouts use the original reaction IDs, including removed and merged ones
+        removed = [r for r, (target, _) in compressed.compression.reactions.items() if target is None][:2]
+        merged = [r for r, (target, _) in compressed.compression.reactions.items()
+                  if target is not None and target != r][:3]
+        targets = removed + merged
+        screen = gem2cue.knockouts.knockout_screen(strain, kind='reaction', targets=targets)
+        compressed_screen = gem2cue.knockouts.knockout_screen(compressed, kind='reaction', targets=targets)
+        np.testing.assert_allclose(compressed_screen['growth'], screen['growth'], atol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
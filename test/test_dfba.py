@@ -0,0 +1,112 @@
+import unittest
+import os
+import cobra
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.strain
+import gem2cue.dfba
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestTimecourse(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+        self.uptake = {'EX_co2_e': 1000, 'EX_glc__D_e': 10, 'EX_h_e': 1000, 'EX_h2o_e': 1000,
+                       'EX_nh4_e': 1000, 'EX_o2_e': 15, 'EX_pi_e': 1000}
+
+    def test_timecourse(self):
+        "Test a batch culture of E. coli on glucose"
+        ecoli = gem2cue.strain.Strain('ecoli', self.model, self.uptake)
+        init_conc = {'EX_glc__D_e': 20, 'EX_o2_e': 1000, 'EX_nh4_e': 1000, 'EX_pi_e': 1000,
+                     'EX_h_e': 1000, 'EX_h2o_e': 1000}
+        timecourse = gem2cue.dfba.Timecourse([ecoli], {'ecoli': 0.01}, init_conc)
+
+        # Run the simulation
+        cue = timecourse.run(t_end=24)
+
+        # Check the time points
+        self.assertEqual(timecourse.time[0], 0)
+        self.assertAlmostEqual(timecourse.time[-1], 24)
+        self.assertTrue(np.all(np.diff(timecourse.time) > 0))
+
+        # Biomass grows while glucose is used up
+        self.assertGreater(timecourse.biomass['ecoli'].iloc[-1], 1)
+        self.assertLess(timecourse.concentrations['EX_glc__D_e'].iloc[-1], 0.1)
+        self.assertTrue(np.all(np.diff(timecourse.concentrations['EX_glc__D_e']) <= 0))
+        self.assertTrue(np.all(timecourse.concentrations.to_numpy() >= 0))
+
+        # CUE is defined while there is glucose and not once growth stops
+        self.assertEqual(list(cue.columns), ['ecoli'])
+        self.assertTrue(0 < cue['ecoli'].iloc[0] < 1)
+        self.assertTrue(np.isnan(cue['ecoli'].iloc[-1]))
+
+        # The model is left as it was
+        self.assertEqual(self.model.medium['EX_glc__D_e'], 10)
+
+    def test_community(self):
+        "Test a glucose consumer cross-feeding acetate to an acetate consumer"
+        init_conc = {'EX_glc__D_e': 20, 'EX_o2_e': 1000, 'EX_nh4_e': 1000, 'EX_pi_e': 1000,
+                     'EX_h_e': 1000, 'EX_h2o_e': 1000}
+        glucose = gem2cue.strain.Strain('glucose', self.model.copy(), self.uptake)
+
+        # The acetate consumer can only take up acetate as a carbon source
+        acetate_model = self.model.copy()
+        acetate_model.medium = {'EX_ac_e': 10, 'EX_o2_e': 1000, 'EX_nh4_e': 1000, 'EX_pi_e': 1000,
+                                'EX_h_e': 1000, 'EX_h2o_e': 1000}
+        acetate_uptake = {r: 1000 for r in acetate_model.medium}
+        acetate_uptake.update({'EX_ac_e': 10, 'EX_o2_e': 15})
+        acetate = gem2cue.strain.Strain('acetate', acetate_model, acetate_uptake)
+
+        timecourse = gem2cue.dfba.Timecourse([glucose, acetate], [0.01, 0.01], init_conc)
+
+        # The pool is the union of the exchange reactions of both strains
+        pool = timecourse.pool
+        self.assertEqual(len(pool.ids), len(self.model.exchanges))
+        self.assertEqual(pool.matrix.shape, (len(pool.ids), 2 * len(self.model.exchanges)))
+
+        # Run the simulation
+        cue = timecourse.run(t_end=24)
+        self.assertEqual(list(cue.columns), ['glucose', 'acetate'])
+
+        # The acetate consumer can only start growing once acetate is secreted
+        self.assertTrue(np.isnan(cue['acetate'].iloc[0]))
+        self.assertEqual(timecourse.growth['acetate'].iloc[0], 0)
+        self.assertGreater(timecourse.biomass['acetate'].iloc[-1], 0.1)
+
+    def test_split_population(self):
+        "Test that splitting one population into two strains changes nothing"
+        one = gem2cue.dfba.Timecourse([gem2cue.strain.Strain('a', self.model.copy(), self.uptake)], [0.01])
+        two = gem2cue.dfba.Timecourse([gem2cue.strain.Strain('a', self.model.copy(), self.uptake),
+                                       gem2cue.strain.Strain('b', self.model.copy(), self.uptake)],
+                                      [0.005, 0.005])
+        one.run(t_end=5)
+        two.run(t_end=5)
+        self.assertAlmostEqual(one.biomass['a'].iloc[-1], two.biomass.iloc[-1].sum())
+
+    def test_missing_co2(self):
+        "Test that rCUE needs the respiration reaction"
+        ecoli = gem2cue.strain.Strain('ecoli', self.model, self.uptake)
+        timecourse = gem2cue.dfba.Timecourse([ecoli], [0.01])
+        with self.assertRaises(KeyError):
+            timecourse.run(t_end=1, co2_rxn='EX_co2_typo')
+
+    def test_initial_biomass(self):
+        "Test that there must be one initial biomass for each strain"
+        ecoli = gem2cue.strain.Strain('ecoli', self.model, self.uptake)
+        with self.assertRaises(ValueError):
+            gem2cue.dfba.Timecourse([ecoli], [0.01, 0.01])
+        with self.assertRaises(ValueError):
+            gem2cue.dfba.Timecourse([ecoli], {'coli': 0.01})
+
+    def test_missing_uptake(self):
+        "Test that uptake rates must cover the medium"
+        with self.assertRaises(KeyError):
+            gem2cue.strain.Strain('ecoli', self.model, {'EX_glc__D_e': 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import warnings
+import cobra
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.strain
+import gem2cue.ensemble
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+
+    def test_uptake_matrix(self):
+        "Test that the draws of a metabolite do not depend on the others"
+        uptakes = gem2cue.ensemble.uptake_matrix(['EX_glc__D_e', 'EX_o2_e'], 10, seed=1)
+        self.assertEqual(uptakes.shape, (10, 2))
+        self.assertTrue(((uptakes >= 0) & (uptakes < 1)).all())
+        np.testing.assert_array_equal(uptakes[:, 1], gem2cue.ensemble.uptake_matrix(['EX_o2_e'], 10, seed=1)[:, 0])
+        self.assertFalse(np.allclose(uptakes, gem2cue.ensemble.uptake_matrix(['EX_glc__D_e', 'EX_o2_e'], 10, seed=2)))
+
+        # Seeded strains share their uptake rates
+        one = gem2cue.strain.Strain('one', self.model, seed=1)
+        two = gem2cue.strain.Strain('two', self.model, seed=1)
+        self.assertEqual(one.metabolite_uptake, two.metabolite_uptake)
+        self.assertEqual(one.metabolite_uptake['EX_o2_e'], uptakes[0, 1])
+
+    def test_uptake_ensemble(self):
+        "Test the CUE of each draw against solving it from scratch"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model, copy=False)
+        ensemble = gem2cue.ensemble.uptake_ensemble([ecoli], n=30, seed=0, chunk_size=7)
+
+        # Solve the first few draws on their own
+        medium = self.model.medium
+        draws = gem2cue.ensemble.uptake_matrix(list(medium), 5, seed=0)
+        for i, draw in enumerate(draws):
+            strain = gem2cue.utils.Strain("draw", self.model)
+            strain.update_medium(gem2cue.utils.Media({r: b * d for (r, b), d in zip(medium.items(), draw)}))
+            experiment = gem2cue.utils.Experiment(strain)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                experiment.run()
+            if experiment.solution.status == 'optimal':
+                experiment.CUE()
+                self.assertAlmostEqual(ensemble.cue['ecoli'][i], experiment.cue)
+            else:
+                self.assertTrue(np.isnan(ensemble.cue['ecoli'][i]))
+
+        # The summaries
+        self.assertEqual(ensemble.n_samples['ecoli'], 30)
+        self.assertEqual(ensemble.histogram.loc['ecoli'].sum(), ensemble.n_cue['ecoli'])
+        self.assertAlmostEqual(ensemble.quantiles.loc['ecoli', 0.5], np.nanmedian(ensemble.cue['ecoli']))
+
+        # The same seed gives the same ensemble, whatever the chunks
+        again = gem2cue.ensemble.uptake_ensemble([ecoli], n=30, seed=0)
+        np.testing.assert_allclose(again.cue['ecoli'], ensemble.cue['ecoli'])
+
+    def test_missing_co2(self):
+        "Test that rCUE needs the respiration reaction, and GGE does not"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model, copy=False)
+        with self.assertRaises(KeyError):
+            gem2cue.ensemble.uptake_ensemble([ecoli], n=5, co2_rxn='EX_co2_typo')
+
+        gge = gem2cue.ensemble.uptake_ensemble([ecoli], n=5, definition='GGE')
+        typo = gem2cue.ensemble.uptake_ensemble([ecoli], n=5, definition='GGE', co2_rxn='EX_co2_typo')
+        np.testing.assert_allclose(typo.cue['ecoli'], gge.cue['ecoli'])
+
+
+if __name__ == '__main__':
+    unittest.main()
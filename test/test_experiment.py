@@ -2,6 +2,8 @@ from operator import mod
 import unittest
 import os
 import cobra
+import numpy as np
+from scipy import sparse
 
 import gem2cue.utils
 
@@ -35,5 +37,205 @@ class TestExperiment(unittest.TestCase):
         # Check that the result is as expected
         self.assertEqual(ecoli_exp.cue, 0.6198361114965819)
 
+    def test_atomExchangeMetabolite(self):
+        "Test finding the number of carbon atoms in each exchange reaction"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_exp = gem2cue.utils.Experiment(gem2cue.utils.Strain("ecoli", model))
+
+        # Call the method
+        out_value = ecoli_exp._atomExchangeMetabolite()
+
+        # Make sure that what came out is exactly what expected
+        comparison_value = {'EX_ac_e': 2,
+                            'EX_acald_e': 2,
+                            'EX_akg_e': 5,
+                            'EX_co2_e': 1,
+                            'EX_etoh_e': 2,
+                            'EX_for_e': 1,
+                            'EX_fru_e': 6,
+                            'EX_fum_e': 4,
+                            'EX_glc__D_e': 6,
+                            'EX_gln__L_e': 5,
+                            'EX_glu__L_e': 5,
+                            'EX_lac__D_e': 3,
+                            'EX_mal__L_e': 4,
+                            'EX_pyr_e': 3,
+                            'EX_succ_e': 4}
+        self.assertEqual(out_value, comparison_value)
+
+    def test_cue_from_fluxes(self):
+        "Test computing CUE and GGE for a matrix of exchange fluxes"
+        # Read in a model and solve it
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+        solution = ecoli_strain.model.optimize()
+
+        # Stack the solution, the solution at half scale, and no flux at all
+        index = ecoli_strain.exchange_index()
+        fluxes = solution.fluxes[index.reaction_ids].to_numpy()
+        flux_matrix = np.vstack([fluxes, fluxes / 2, np.zeros_like(fluxes)])
+
+        # Call the function
+        rcue, gge = gem2cue.utils.cue_from_fluxes(flux_matrix, index.atoms, index.position('EX_co2_e'))
+
+        # Check each row
+        self.assertEqual(rcue.shape, (3,))
+        self.assertAlmostEqual(rcue[0], 0.6198361114965837)
+        self.assertAlmostEqual(rcue[1], 0.6198361114965837)
+        self.assertAlmostEqual(gge[0], 0.6198361114965837)
+        self.assertTrue(np.isnan(rcue[2]))
+        self.assertTrue(np.isnan(gge[2]))
+
+    def test_compact_experiment(self):
+        "Test keeping compact results instead of the cobra Solution"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_exp = gem2cue.utils.Experiment(gem2cue.utils.Strain("ecoli", model), compact=True)
+
+        # Run FBA and CUE
+        ecoli_exp.CUE()
+
+        # Only the compact result is kept
+        self.assertIsNone(ecoli_exp.solution)
+        result = ecoli_exp.result
+        self.assertEqual(result.status, 'optimal')
+        self.assertAlmostEqual(result.objective_value, 0.8739215069684279)
+        self.assertEqual(result.exchange_fluxes.dtype, np.float32)
+        self.assertEqual(len(result.exchange_fluxes), len(result.reaction_ids))
+        self.assertAlmostEqual(ecoli_exp.cue, 0.6198361114965837, places=5)
+        self.assertAlmostEqual(result.cue, ecoli_exp.cue)
+        self.assertAlmostEqual(result.gge, 0.6198361114965837, places=5)
+
+    def test_use_efficiency(self):
+        "Test calculating the use efficiency of several elements at once"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+        ecoli_exp = gem2cue.utils.Experiment(ecoli_strain)
+
+        # Run the method
+        out_value = ecoli_exp.use_efficiency()
+
+        # Carbon matches CUE, nitrogen and phosphate are not secreted, and
+        # there is no sulfur in the core model
+        self.assertEqual(list(out_value.keys()), ['CUE', 'NUE', 'PUE', 'SUE'])
+        self.assertAlmostEqual(out_value['CUE'], 0.6198361114965837)
+        self.assertAlmostEqual(out_value['NUE'], 1)
+        self.assertAlmostEqual(out_value['PUE'], 1)
+        self.assertIsNone(out_value['SUE'])
+        self.assertEqual(ecoli_exp.use_efficiencies, out_value)
+
+        # The carbon column of the element matrix matches the exchange index
+        element_matrix = ecoli_strain.element_matrix()
+        carbon = element_matrix.matrix[:, 0].toarray().ravel()
+        self.assertEqual({r: c for r, c in zip(element_matrix.reaction_ids, carbon) if c},
+                         ecoli_strain.exchange_index().as_dict())
+
+    def test_CUE_range(self):
+        "Test the range of CUE over alternative optima"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_exp = gem2cue.utils.Experiment(gem2cue.utils.Strain("ecoli", model))
+
+        # At the optimum the range is the optimal CUE
+        low, high = ecoli_exp.CUE_range()
+        self.assertAlmostEqual(low, 0.6198361114965837, places=6)
+        self.assertAlmostEqual(high, 0.6198361114965837, places=6)
+        self.assertEqual(ecoli_exp.cue_range, (low, high))
+
+        # Below the optimum the range contains the optimal CUE
+        for definition in ['rCUE', 'GGE']:
+            low, high = ecoli_exp.CUE_range(0.95, definition=definition)
+            self.assertLess(low, 0.6198361114965837 - 1e-3)
+            self.assertGreaterEqual(high, 0.6198361114965837 - 1e-6)
+            self.assertLessEqual(high, 1)
+
+        # The model is left unchanged
+        ecoli_exp.CUE()
+        self.assertAlmostEqual(ecoli_exp.cue, 0.6198361114965837)
+
+    def test_CUE_range_both_ways(self):
+        "Test the exact range of CUE when CO2 can be taken up or secreted"
+        # Read in a model, with low oxygen and CO2 in the medium
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+        ecoli_strain.update_medium(gem2cue.utils.Media({'EX_glc__D_e': 10, 'EX_o2_e': 2, 'EX_co2_e': 1000,
+                                                        'EX_nh4_e': 1000, 'EX_pi_e': 1000, 'EX_h2o_e': 1000,
+                                                        'EX_h_e': 1000}))
+        ecoli_exp = gem2cue.utils.Experiment(ecoli_strain)
+
+        # The CO2 exchange is split by direction, rather than bounded from the flux ranges
+        low, high = ecoli_exp.CUE_range(0.9)
+        self.assertAlmostEqual(low, 0.7015209433769822, places=5)
+        self.assertAlmostEqual(high, 1)
+        outer = ecoli_exp.CUE_range(0.9, max_splits=0)
+        self.assertLess(outer[0], low - 0.01)
+
+        # The GGE range holds the optimum, and is far tighter than the outer bounds
+        ecoli_exp.CUE(definition='GGE')
+        low, high = ecoli_exp.CUE_range(0.9, definition='GGE')
+        self.assertLessEqual(low, ecoli_exp.cue + 1e-6)
+        self.assertGreaterEqual(high, ecoli_exp.cue - 1e-6)
+        self.assertGreater(low, 0.15)
+        self.assertLess(high, 0.21)
+        self.assertLess(ecoli_exp.CUE_range(0.9, definition='GGE', max_splits=0)[0], 0)
+
+    def test_CUE_sensitivity(self):
+        "Test the sensitivity of CUE to the uptake bounds"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+        ecoli_exp = gem2cue.utils.Experiment(ecoli_strain)
+
+        # Run the method
+        out_value = ecoli_exp.CUE_sensitivity()
+        self.assertEqual(list(out_value.index), list(model.medium))
+        self.assertIs(ecoli_exp.cue_sensitivity, out_value)
+
+        # Only glucose limits growth
+        self.assertEqual(list(out_value[out_value != 0].index), ['EX_glc__D_e'])
+
+        # Compare with raising the glucose uptake and solving again
+        ecoli_exp.CUE()
+        with model:
+            model.reactions.EX_glc__D_e.lower_bound -= 1e-3
+            perturbed = gem2cue.utils.Experiment(gem2cue.utils.Strain("ecoli", model))
+            perturbed.CUE()
+        self.assertAlmostEqual(out_value['EX_glc__D_e'], (perturbed.cue - ecoli_exp.cue) / 1e-3, places=5)
+
+    def test_CUE_sensitivity_directions(self):
+        "Test the sensitivity on a larger model, and directions that are not unique"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'iIT341.xml'))
+        pylori_exp = gem2cue.utils.Experiment(gem2cue.utils.Strain("pylori", model))
+        out_value = pylori_exp.CUE_sensitivity()
+        self.assertEqual(list(out_value[out_value != 0].index), ['EX_o2_e', 'EX_ala__D_e', 'EX_ala__L_e'])
+
+        # Compare with raising each limiting uptake and solving again
+        pylori_exp.CUE()
+        for rxn_id in out_value[out_value != 0].index:
+            with model:
+                model.reactions.get_by_id(rxn_id).lower_bound -= 1e-3
+                perturbed = gem2cue.utils.Experiment(gem2cue.utils.Strain("pylori", model))
+                perturbed.CUE()
+            self.assertAlmostEqual(out_value[rxn_id], (perturbed.cue - pylori_exp.cue) / 1e-3, places=5)
+
+        # Dependent free columns give no direction, their bounds are re-solved instead
+        S = sparse.csc_matrix(np.array([[1.0, -1.0, -1.0, 0.0], [0.0, 1.0, 1.0, -1.0]]))
+        directions, valid = gem2cue.utils._bound_directions(S, np.array([1, 2, 3]), np.array([0]), np.array([1.0]))
+        self.assertFalse(valid[0])
+        directions, valid = gem2cue.utils._bound_directions(S, np.array([1, 3]), np.array([0]), np.array([1.0]))
+        self.assertTrue(valid[0])
+        np.testing.assert_allclose(directions[0], [1, 1, 0, 1])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
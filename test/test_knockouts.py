@@ -0,0 +1,93 @@
+import unittest
+import os
+import cobra
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.knockouts
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestKnockouts(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+
+    def test_reaction_screen(self):
+        "Test the single reaction knockouts against knocking them out of copies"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model, copy=False)
+        targets = ['PGI', 'CS', 'ENO', 'PFL', 'ATPS4r']
+        screen = gem2cue.knockouts.knockout_screen(ecoli, kind='reaction', targets=targets)
+
+        # The wild type comes first
+        self.assertEqual(list(screen['knockout']), [()] + [(t,) for t in targets])
+        self.assertAlmostEqual(screen['cue'][0], 0.6198361114965837)
+
+        for i, target in enumerate(targets, start=1):
+            # Knock the reaction out of a copy of the model
+            knockout = gem2cue.utils.Strain(target, self.model)
+            knockout.model.reactions.get_by_id(target).knock_out()
+            experiment = gem2cue.utils.Experiment(knockout)
+            experiment.run()
+            self.assertAlmostEqual(screen['growth'][i], experiment.solution.objective_value)
+            # CUE is not unique without growth (CS and ENO are lethal)
+            if experiment.solution.objective_value > 1e-6:
+                experiment.CUE()
+                self.assertAlmostEqual(screen['cue'][i], experiment.cue)
+
+        # The shared model is left unchanged
+        self.assertEqual(self.model.reactions.PGI.bounds, (-1000.0, 1000.0))
+
+    def test_double_screen(self):
+        "Test pruning double knockouts, and running over a pool"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        targets = ['PGI', 'ENO', 'PFL', 'G6PDH2r']
+        serial = gem2cue.knockouts.knockout_screen(ecoli, kind='reaction', targets=targets, double=True)
+
+        # No pairs with the lethal ENO knockout
+        self.assertEqual(list(serial['knockout'][5:]),
+                         [('PGI', 'PFL'), ('PGI', 'G6PDH2r'), ('PFL', 'G6PDH2r')])
+
+        # The same in parallel, in small chunks
+        parallel = gem2cue.knockouts.knockout_screen(ecoli, kind='reaction', targets=targets, double=True,
+                                                     workers=2, chunk_size=2)
+        self.assertEqual(list(parallel['knockout']), list(serial['knockout']))
+        np.testing.assert_allclose(parallel['gge'], serial['gge'])
+
+    def test_wild_type_basis(self):
+        "Test that every knockout starts from the wild-type basis, whatever the chunks"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        with ecoli.context() as model:
+            model.slim_optimize()
+            basis = gem2cue.knockouts._get_basis(model)
+            with model:
+                model.reactions.ENO.knock_out()
+                model.slim_optimize()
+            gem2cue.knockouts._set_basis(model, basis)
+            self.assertEqual(gem2cue.knockouts._get_basis(model), basis)
+
+        screen = gem2cue.knockouts.knockout_screen(ecoli, kind='reaction')
+        one_by_one = gem2cue.knockouts.knockout_screen(ecoli, kind='reaction', chunk_size=1)
+        self.assertEqual(list(one_by_one['status']), list(screen['status']))
+        np.testing.assert_array_equal(one_by_one['gge'], screen['gge'])
+
+    def test_gene_screen(self):
+        "Test knocking out genes"
+        ecoli = gem2cue.utils.Strain("ecoli", self.model)
+        screen = gem2cue.knockouts.knockout_screen(ecoli)
+        self.assertEqual(len(screen), len(self.model.genes) + 1)
+        self.assertEqual(set(screen['status']), {'optimal', 'infeasible'})
+
+        with self.assertRaises(KeyError):
+            gem2cue.knockouts.knockout_screen(ecoli, targets=['not_a_gene'])
+
+        # A misspelled respiration reaction is caught before screening
+        with self.assertRaises(KeyError):
+            gem2cue.knockouts.knockout_screen(ecoli, co2_rxn='EX_co2_typo')
+
+
+if __name__ == '__main__':
+    unittest.main()
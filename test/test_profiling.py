@@ -0,0 +1,96 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import cobra
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.batch
+import gem2cue.cache
+import gem2cue.knockouts
+import gem2cue.profiling
+import gem2cue.utils
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        # Read in a model
+        self.model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+
+    def test_phases(self):
+        "Test timing the phases of experiments"
+        events = []
+        with gem2cue.profiling.profile() as profiler:
+            profiler.add_hook(lambda name, seconds, info: events.append((name, info)))
+            strain = gem2cue.utils.Strain("ecoli", self.model)
+            for _ in range(3):
+                gem2cue.utils.Experiment(strain).CUE()
+        stats = profiler.stats()
+
+        self.assertEqual(stats['phases']['strain.copy']['count'], 1)
+        self.assertEqual(stats['phases']['experiment.run']['count'], 3)
+        self.assertEqual(stats['phases']['experiment.solve']['count'], 3)
+        self.assertEqual(stats['phases']['experiment.cue']['count'], 3)
+        solve = stats['phases']['experiment.solve']
+        self.assertLessEqual(solve['p50'], solve['p99'])
+        self.assertLessEqual(solve['p99'], solve['max'])
+
+        # The exchange index is built once, and later solves start from the last basis
+        self.assertEqual(stats['counters']['strain.index.miss'], 1)
+        self.assertEqual(stats['counters']['strain.index.hit'], 2)
+        iterations = [info['iterations'] for name, info in events if name == 'experiment.solve']
+        self.assertGreater(iterations[0], 0)
+        self.assertEqual(stats['counters']['solver.iterations'], sum(iterations))
+        self.assertEqual(len(events), sum(p['count'] for p in stats['phases'].values()))
+
+        # The JSON export
+        self.assertEqual(json.loads(profiler.to_json()), stats)
+
+        # Nothing is recorded once the context exits
+        self.assertIsNone(gem2cue.profiling.get_profiler())
+        gem2cue.utils.Experiment(strain).CUE()
+        self.assertEqual(profiler.stats(), stats)
+
+    def test_workers(self):
+        "Test merging the phases timed in worker processes"
+        strains = [gem2cue.utils.Strain(f"ecoli{i}", self.model) for i in range(3)]
+        path = os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml')
+        with gem2cue.profiling.profile() as profiler:
+            gem2cue.batch.run_batch(strains, workers=2)
+            with gem2cue.cache.default_cache(None):
+                gem2cue.batch.run_files([path, path], workers=2)
+            gem2cue.knockouts.knockout_screen(strains[0], kind='reaction', targets=['PGI', 'PFL', 'ENO'],
+                                              workers=2, chunk_size=2)
+        stats = profiler.stats()
+        self.assertEqual(stats['phases']['experiment.solve']['count'], 5)
+        self.assertEqual(stats['phases']['knockouts.solve']['count'], 4)
+        self.assertGreater(stats['counters']['solver.iterations'], 0)
+
+    def test_cache_counters(self):
+        "Test counting hits of the solution and model caches"
+        cache_dir = tempfile.mkdtemp()
+        try:
+            solution_cache = gem2cue.cache.SolutionCache(os.path.join(cache_dir, 'solutions'))
+            model_cache = gem2cue.cache.ModelCache(os.path.join(cache_dir, 'models'))
+            strain = gem2cue.utils.Strain("ecoli", self.model)
+            with gem2cue.profiling.profile() as profiler:
+                for _ in range(2):
+                    gem2cue.utils.Experiment(strain, solution_cache=solution_cache).run()
+                    gem2cue.cache.load_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'), model_cache)
+            counters = profiler.stats()['counters']
+            self.assertEqual(counters['solution_cache.miss'], 1)
+            self.assertEqual(counters['solution_cache.hit'], 1)
+            self.assertEqual(counters['model_cache.miss'], 1)
+            self.assertEqual(counters['model_cache.hit'], 1)
+            solution_cache.close()
+            model_cache.close()
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
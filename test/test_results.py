@@ -0,0 +1,149 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cobra
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.batch
+import gem2cue.results
+import gem2cue.utils
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestResultSet(unittest.TestCase):
+    def test_result_set(self):
+        "Test collecting compact results and exporting them to pandas"
+        ids_1 = ['EX_glc__D_e', 'EX_co2_e']
+        ids_2 = ['EX_ac_e', 'EX_co2_e']
+        results = gem2cue.results.ResultSet()
+        results.append('a', gem2cue.results.ExperimentResult(0.8, 'optimal', [-10, 23], ids_1, cue=0.6, gge=0.6))
+        results.append('b', gem2cue.results.ExperimentResult(0.2, 'optimal', [-10, 12], ids_2, cue=0.4, gge=0.4))
+        results.append('c', gem2cue.results.ExperimentResult(None, 'infeasible', [np.nan, np.nan], ids_2))
+        self.assertEqual(len(results), 3)
+
+        # Export the summary
+        table = results.to_pandas()
+        self.assertEqual(list(table.columns), ['name', 'status', 'objective_value', 'cue', 'gge'])
+        self.assertEqual(list(table['name']), ['a', 'b', 'c'])
+        self.assertAlmostEqual(table['cue'][1], 0.4)
+        self.assertTrue(np.isnan(table['cue'][2]))
+        self.assertTrue(np.isnan(table['objective_value'][2]))
+
+        # Export with the fluxes, missing reactions are NaN
+        table = results.to_pandas(fluxes=True)
+        self.assertEqual(table['EX_co2_e'][0], 23)
+        self.assertEqual(table['EX_ac_e'][1], -10)
+        self.assertTrue(np.isnan(table['EX_ac_e'][0]))
+
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+
+    def test_writer(self):
+        "Test writing results in chunks and picking up where it left off"
+        ids = ['EX_glc__D_e', 'EX_co2_e']
+        result = gem2cue.results.ExperimentResult(0.8, 'optimal', [-10, 23], ids, cue=0.6, gge=0.6)
+
+        writer = gem2cue.results.ResultWriter(self.out_dir, chunk_size=2)
+        writer.write('a', result, medium='glucose')
+        # Nothing is on disk until a chunk is full
+        self.assertEqual(len(gem2cue.results.read_results(self.out_dir)), 0)
+        writer.write('b', result, medium='glucose')
+        writer.write('a', result, medium='acetate')
+        # The first chunk can be read while the writer is still going
+        self.assertEqual(len(gem2cue.results.read_results(self.out_dir)), 2)
+        writer.close()
+
+        # Everything is there after closing
+        results = gem2cue.results.read_results(self.out_dir)
+        self.assertEqual(list(results['strain']), ['a', 'b', 'a'])
+        self.assertEqual(list(results['medium']), ['glucose', 'glucose', 'acetate'])
+        self.assertAlmostEqual(results['cue'][0], 0.6)
+        fluxes = gem2cue.results.read_results(self.out_dir, fluxes=True)
+        self.assertEqual(len(fluxes), 6)
+        self.assertEqual(list(fluxes['flux'][:2]), [-10, 23])
+
+        # Reopening knows what is done, and adds new chunks after the old ones
+        writer = gem2cue.results.ResultWriter(self.out_dir, chunk_size=2)
+        self.assertTrue(writer.is_done('a', 'glucose'))
+        self.assertTrue(writer.is_done('a', 'acetate'))
+        self.assertFalse(writer.is_done('b', 'acetate'))
+        writer.write('b', result, medium='acetate')
+        writer.close()
+        self.assertEqual(len(gem2cue.results.read_results(self.out_dir)), 4)
+
+    def test_writer_default(self):
+        "Test that by default every result is on disk as soon as it is written"
+        ids = ['EX_glc__D_e', 'EX_co2_e']
+        result = gem2cue.results.ExperimentResult(0.8, 'optimal', [-10, 23], ids, cue=0.6, gge=0.6)
+        writer = gem2cue.results.ResultWriter(self.out_dir)
+        writer.write('a', result)
+        self.assertEqual(list(gem2cue.results.read_results(self.out_dir)['strain']), ['a'])
+        writer.write('b', result)
+        self.assertEqual(list(gem2cue.results.read_results(self.out_dir)['strain']), ['a', 'b'])
+        writer.close()
+
+    def test_many_chunks(self):
+        "Test that chunks past 99999 are read in order and numbered on from"
+        ids = ['EX_glc__D_e', 'EX_co2_e']
+        result = gem2cue.results.ExperimentResult(0.8, 'optimal', [-10, 23], ids, cue=0.6, gge=0.6)
+        writer = gem2cue.results.ResultWriter(self.out_dir)
+        writer.n_chunks = 99999
+        writer.write('a', result)
+        writer.write('b', result)
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'results-100000.csv')))
+        self.assertEqual(list(gem2cue.results.read_results(self.out_dir)['strain']), ['a', 'b'])
+        self.assertEqual(len(gem2cue.results.read_results(self.out_dir, fluxes=True)), 4)
+
+        # Reopening sees both chunks, and does not overwrite the last one
+        writer = gem2cue.results.ResultWriter(self.out_dir)
+        self.assertTrue(writer.is_done('b'))
+        self.assertEqual(writer.n_chunks, 100001)
+        writer.write('c', result)
+        self.assertEqual(list(gem2cue.results.read_results(self.out_dir)['strain']), ['a', 'b', 'c'])
+
+    def test_batch_sink(self):
+        "Test streaming a batch to a writer and resuming it"
+        model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+        glucose = gem2cue.utils.Strain('ecoli', model, copy=False)
+        acetate = gem2cue.utils.Strain('ecoli', model, copy=False)
+        acetate.update_medium(gem2cue.utils.Media({'EX_co2_e': 1000.0, 'EX_ac_e': 10.0, 'EX_h_e': 1000.0,
+                                                   'EX_h2o_e': 1000.0, 'EX_nh4_e': 1000.0, 'EX_o2_e': 1000.0,
+                                                   'EX_pi_e': 1000.0}, name='acetate'))
+
+        # Run only the first strain, as if the campaign was interrupted
+        with gem2cue.results.ResultWriter(self.out_dir) as writer:
+            gem2cue.batch.run_batch([glucose], sink=writer)
+
+        # Rerun everything, the first strain is skipped
+        with gem2cue.results.ResultWriter(self.out_dir) as writer:
+            table = gem2cue.batch.run_batch([glucose, acetate], sink=writer)
+        self.assertEqual(len(table), 1)
+
+        results = gem2cue.results.read_results(self.out_dir)
+        self.assertEqual(list(results['medium']), ['', 'acetate'])
+        self.assertAlmostEqual(results['cue'][0], 0.6198361114965837)
+        self.assertAlmostEqual(results['objective_value'][0], 0.8739215069684279)
+
+    def test_batch_sink_missing_co2(self):
+        "Test that results without the respiration reaction are errors, not rCUE of 1"
+        model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+        # No carbon source, so CUE is never computed and only the kept result needs CO2
+        starved = gem2cue.utils.Strain('starved', model, copy=False)
+        starved.update_medium(gem2cue.utils.Media({'EX_h_e': 1000.0, 'EX_h2o_e': 1000.0}))
+        with gem2cue.results.ResultWriter(self.out_dir) as writer:
+            table = gem2cue.batch.run_batch([starved], sink=writer, co2_rxn='EX_co2_typo')
+        self.assertEqual(table['status'][0], 'error')
+        self.assertIn('KeyError', table['error'][0])
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,77 @@ class TestStrain(unittest.TestCase):
         self.assertEqual(ecoli_strain.model.medium,
             {'EX_ac_e': 10.0, 'EX_co2_e': 1000.0, 'EX_h_e': 1000.0, 'EX_h2o_e': 1000.0, 'EX_nh4_e': 1000.0, 'EX_pi_e': 1000.0})
 
+    def test_exchange_index(self):
+        "Test that the exchange index is cached and rebuilt when the model changes"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+
+        # Make a Strain object
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+
+        # Check the contents of the index
+        index = ecoli_strain.exchange_index()
+        self.assertEqual(len(index.reaction_ids), 15)
+        self.assertEqual(index.atoms[index.position('EX_glc__D_e')], 6)
+        self.assertEqual(index.atoms[index.position('EX_co2_e')], 1)
+        self.assertIsNone(index.position('EX_o2_e'))
+
+        # Asking again should not rebuild the index
+        self.assertIs(ecoli_strain.exchange_index(), index)
+        # Changing the medium does not change the structure
+        ecoli_strain.update_medium(gem2cue.utils.Media({'EX_ac_e': 10.0}))
+        self.assertIs(ecoli_strain.exchange_index(), index)
+
+        # Adding a new exchange reaction should rebuild it
+        ecoli_strain.model.add_boundary(ecoli_strain.model.metabolites.get_by_id('pyr_c'), type='sink')
+        self.assertIsNot(ecoli_strain.exchange_index(), index)
+
+        # Editing the stoichiometry in place needs the indexes dropped by hand
+        structure = ecoli_strain.structure_hash()
+        ecoli_strain.model.reactions.PGI.add_metabolites({ecoli_strain.model.metabolites.h2o_c: -1})
+        self.assertEqual(ecoli_strain.structure_hash(), structure)
+        ecoli_strain.invalidate_indexes()
+        self.assertNotEqual(ecoli_strain.structure_hash(), structure)
+
+    def test_shared_strains(self):
+        "Test strains sharing one model with different media"
+        # Read in a model
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        model = cobra.io.read_sbml_model(os.path.join(test_dir, 'test_files', 'EC_core_flux1.xml'))
+        original_medium = model.medium
+
+        # Make two Strain objects on the same model
+        glucose = gem2cue.utils.Strain("glucose", model, copy=False)
+        acetate = gem2cue.utils.Strain("acetate", model, copy=False)
+        self.assertIs(glucose.model, acetate.model)
+
+        # Give one of them a new medium, the shared model should not change
+        acetate.update_medium(gem2cue.utils.Media({'EX_co2_e': 1000.0, 'EX_ac_e': 10.0, 'EX_h_e': 1000.0,
+                                                   'EX_h2o_e': 1000.0, 'EX_nh4_e': 1000.0, 'EX_o2_e': 1000.0,
+                                                   'EX_pi_e': 1000.0}))
+        self.assertEqual(model.medium, original_medium)
+
+        # The medium is applied in the context only
+        with acetate.context() as m:
+            self.assertEqual(m.medium['EX_ac_e'], 10.0)
+            self.assertNotIn('EX_glc__D_e', m.medium)
+        self.assertEqual(model.medium, original_medium)
+
+        # Solving gives different answers for the two strains
+        glucose_exp = gem2cue.utils.Experiment(glucose)
+        glucose_exp.run()
+        acetate_exp = gem2cue.utils.Experiment(acetate)
+        acetate_exp.run()
+        self.assertAlmostEqual(glucose_exp.solution.objective_value, 0.8739215069684279)
+        self.assertLess(acetate_exp.solution.objective_value, glucose_exp.solution.objective_value)
+
+        # Copy on write: owning the model copies it and keeps the medium
+        acetate.own_model()
+        self.assertIsNot(acetate.model, model)
+        self.assertEqual(acetate.model.medium['EX_ac_e'], 10.0)
+        self.assertEqual(model.medium, original_medium)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
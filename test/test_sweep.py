@@ -0,0 +1,59 @@
+import unittest
+import os
+import cobra
+import numpy as np
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.sweep
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestSweep(unittest.TestCase):
+    def test_media_sweep(self):
+        "Test the CUE grid against solving each medium on its own"
+        # Read in a model
+        model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+        ecoli_strain = gem2cue.utils.Strain("ecoli", model)
+        original_medium = ecoli_strain.model.medium
+
+        # Make some media
+        base = {'EX_co2_e': 1000.0, 'EX_h_e': 1000.0, 'EX_h2o_e': 1000.0, 'EX_nh4_e': 1000.0,
+                'EX_o2_e': 1000.0, 'EX_pi_e': 1000.0}
+        media = {'glucose': gem2cue.utils.Media({**base, 'EX_glc__D_e': 10.0}),
+                 'acetate': gem2cue.utils.Media({**base, 'EX_ac_e': 10.0}),
+                 'nothing': gem2cue.utils.Media(base),
+                 'glucose_low_o2': gem2cue.utils.Media({**base, 'EX_glc__D_e': 10.0, 'EX_o2_e': 5.0})}
+
+        # Call the function
+        grid = gem2cue.sweep.media_sweep([ecoli_strain], media)
+
+        # Check the shape and labels
+        self.assertEqual(list(grid.index), ['ecoli'])
+        self.assertEqual(list(grid.columns), list(media.keys()))
+
+        # Compare with running Experiments one medium at a time
+        for name, medium in media.items():
+            strain = gem2cue.utils.Strain("ecoli", model)
+            strain.update_medium(medium)
+            experiment = gem2cue.utils.Experiment(strain)
+            experiment.CUE()
+            if experiment.cue is None:
+                self.assertTrue(np.isnan(grid.loc['ecoli', name]))
+            else:
+                self.assertAlmostEqual(grid.loc['ecoli', name], experiment.cue)
+
+        # The sweep should leave the strain's model as it was
+        self.assertEqual(ecoli_strain.model.medium, original_medium)
+
+        # rCUE needs the respiration reaction, GGE does not
+        with self.assertRaises(KeyError):
+            gem2cue.sweep.media_sweep([ecoli_strain], media, co2_rxn='EX_co2_typo')
+        gge = gem2cue.sweep.media_sweep([ecoli_strain], media, definition='GGE', co2_rxn='EX_co2_typo')
+        self.assertEqual(gge.shape, grid.shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
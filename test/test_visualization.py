@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cobra
+from matplotlib.figure import Figure
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.utils
+import gem2cue.visualization
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+class TestVisualization(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        # Read in a model
+        model = cobra.io.read_sbml_model(os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml'))
+        self.strain = gem2cue.utils.Strain("ecoli", model)
+
+    def test_carbon_flows(self):
+        "Test splitting up the carbon flow of several experiments"
+        experiments = [gem2cue.utils.Experiment(self.strain),
+                       gem2cue.utils.Experiment(self.strain, compact=True)]
+        flows = gem2cue.visualization.carbon_flows(experiments)
+        self.assertEqual(list(flows.columns), gem2cue.visualization.FLOW_COLUMNS)
+        self.assertEqual(list(flows['strain']), ['ecoli', 'ecoli'])
+
+        for i in range(2):
+            # Glucose is the only carbon source
+            self.assertAlmostEqual(flows['uptake'][i], 60, places=5)
+            self.assertAlmostEqual(flows['exudation'][i], 0, places=5)
+            # Respiration matches rCUE, and the carbon is balanced
+            self.assertAlmostEqual(1 - flows['respiration'][i] / flows['uptake'][i], 0.6198361114965837, places=5)
+            self.assertAlmostEqual(flows['uptake'][i] - flows['respiration'][i] - flows['biomass'][i], 0, places=5)
+
+    def test_missing_co2(self):
+        "Test that rCUE needs the respiration reaction, and GGE does not"
+        experiment = gem2cue.utils.Experiment(self.strain)
+        with self.assertRaises(KeyError):
+            gem2cue.visualization.carbon_flows([experiment], co2_rxn='EX_co2_typo')
+
+        # Without respiration, all the carbon that is not biomass is exuded
+        flows = gem2cue.visualization.carbon_flows([experiment], co2_rxn='EX_co2_typo', definition='GGE')
+        self.assertEqual(flows['respiration'][0], 0)
+        self.assertAlmostEqual(flows['uptake'][0] - flows['exudation'][0] - flows['biomass'][0], 0, places=5)
+
+    def test_render_sankeys(self):
+        "Test saving many diagrams, with repeated strain names"
+        flows = gem2cue.visualization.carbon_flows([gem2cue.utils.Experiment(self.strain)])
+        flows = flows.loc[[0, 0, 0]].reset_index(drop=True)
+        flows.loc[2, 'strain'] = 'other'
+
+        for workers in [1, 2]:
+            paths = gem2cue.visualization.render_sankeys(flows, self.out_dir, workers=workers)
+            self.assertEqual([os.path.basename(p) for p in paths], ['ecoli_0.png', 'ecoli_1.png', 'other.png'])
+            self.assertTrue(all(os.path.getsize(p) > 0 for p in paths))
+
+        # A single diagram
+        fig = gem2cue.visualization.sankey(gem2cue.utils.Experiment(self.strain))
+        self.assertIsInstance(fig, Figure)
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
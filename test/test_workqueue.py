@@ -0,0 +1,84 @@
+import unittest
+import os
+from concurrent.futures import ProcessPoolExecutor
+import shutil
+import tempfile
+import cobra
+
+cobra_config = cobra.Configuration()
+cobra_config.solver = "glpk_exact"
+
+import gem2cue.cache
+import gem2cue.utils
+import gem2cue.workqueue
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+MODEL_FILE = os.path.join(TEST_DIR, 'test_files', 'EC_core_flux1.xml')
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.out_dir, 'queue.db')
+        # Read the models straight from the files, and go back to the previous cache after
+        no_cache = gem2cue.cache.default_cache(None)
+        no_cache.__enter__()
+        self.addCleanup(no_cache.__exit__, None, None, None)
+
+    def test_run(self):
+        "Test running a campaign with several workers"
+        media = {'glucose': gem2cue.utils.Media({'EX_glc__D_e': 10, 'EX_o2_e': 1000, 'EX_nh4_e': 1000,
+                                                 'EX_pi_e': 1000, 'EX_h2o_e': 1000, 'EX_h_e': 1000})}
+        queue = gem2cue.workqueue.WorkQueue(self.path)
+        self.assertEqual(queue.enqueue(os.path.join(TEST_DIR, 'test_files')), 2)
+        self.assertEqual(queue.enqueue(MODEL_FILE, media), 1)
+        # Tasks already in the queue are not added again
+        self.assertEqual(queue.enqueue(MODEL_FILE, media), 0)
+        self.assertEqual(queue.progress()['pending'], 3)
+
+        # Every task is run once, by one of the workers
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            n_tasks = list(pool.map(gem2cue.workqueue.run_worker, [self.path] * 2, ['a', 'b']))
+        self.assertEqual(sum(n_tasks), 3)
+        self.assertTrue(queue.finished())
+        self.assertEqual(queue.progress()['done'], 3)
+
+        results = queue.results().set_index(['strain', 'medium'])
+        self.assertEqual(list(results['attempts']), [1, 1, 1])
+        self.assertAlmostEqual(results.loc[('EC_core_flux1', ''), 'cue'], 0.6198361114965837)
+        self.assertAlmostEqual(results.loc[('EC_core_flux1', 'glucose'), 'cue'], 0.6198361114965837)
+        self.assertAlmostEqual(results.loc[('iIT341', ''), 'cue'], 0.8396726347751796)
+        queue.close()
+
+    def test_leases(self):
+        "Test handing out tasks again when their lease runs out"
+        queue = gem2cue.workqueue.WorkQueue(self.path, lease=0, max_retries=1)
+        queue.enqueue([MODEL_FILE, os.path.join(self.out_dir, 'missing.xml')])
+
+        # The lease of the first worker runs out, so the task goes to the second
+        task, = queue.claim('a')
+        self.assertEqual(queue.progress()['expired'], 1)
+        again, = queue.claim('b')
+        self.assertEqual((again.task, again.attempts), (task.task, 2))
+        row = {'strain': task.strain, 'status': 'optimal', 'growth': 1.0, 'cue': 0.5, 'error': None}
+        self.assertFalse(queue.complete(task.task, 'a', row))
+
+        # Once out of retries, it fails
+        missing, = queue.claim('c')
+        self.assertEqual(missing.strain, 'missing')
+        results = queue.results()
+        self.assertEqual(results['state'][0], 'failed')
+        self.assertEqual(results['error'][0], 'Lease expired 2 times')
+
+        # A model that cannot be read fails without retries
+        self.assertEqual(gem2cue.workqueue.run_worker(self.path, lease=600), 1)
+        results = queue.results()
+        self.assertEqual((results['state'][1], results['attempts'][1]), ('failed', 2))
+        self.assertIn('missing.xml', results['error'][1])
+        queue.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()